@@ -0,0 +1,378 @@
+import asyncio
+import threading
+import time
+import logging
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Callable
+import tello_command
+import tello_hud
+import tello_keyboard
+import tello_pygame
+import tello_watchdog
+import tello_video
+
+@dataclass
+class AsyncRuntimeConfig:
+    """Configuration for the asyncio controller runtime"""
+    tello_ip: str = tello_command.TELLO_IP
+    command_port: int = tello_command.TELLO_COMMAND_PORT
+    state_port: int = tello_command.TELLO_STATE_PORT
+    video_address: str = tello_command.TELLO_VIDEO_ADDRESS
+    command: tello_command.CommandChannelConfig = field(default_factory=tello_command.CommandChannelConfig)
+    state_timeout: float = 3.0  # Seconds to wait for the first state packet
+    ui_rate: float = 60.0  # Hz - pygame events and display
+    video_rate: float = 30.0  # Hz - frame processing
+    control_rate: float = 20.0  # Hz - keyboard input and rc commands
+    detection_rate: float = 10.0  # Hz - face detection in the executor
+    detection_workers: int = 1
+
+
+class FrameReader:
+    """Background thread decoding the Tello video stream, exposes the latest frame like djitellopy"""
+    def __init__(self, address: str):
+        self.address = address
+        self.frame: Optional[np.ndarray] = None
+        self.frame_time = 0.0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+
+    def _read_loop(self):
+        capture = cv2.VideoCapture(self.address)
+        try:
+            while not self.stopped:
+                ok, frame = capture.read()
+                if ok:
+                    self.frame = frame
+                    self.frame_time = time.monotonic()
+                else:
+                    time.sleep(0.005)
+        finally:
+            capture.release()
+
+    def stop(self):
+        self.stopped = True
+        self.thread.join(timeout=1.0)
+
+
+class AsyncTello:
+    """
+    Non-blocking link to a Tello built on asyncio datagram endpoints.
+
+    The coroutine API (connect, command) runs on the event loop. The plain methods mirror
+    the subset of djitellopy.Tello used by DroneController and VideoManager, so those can
+    run unchanged - call them from a worker thread, never from the event loop itself.
+    """
+    def __init__(self, config: AsyncRuntimeConfig = AsyncRuntimeConfig()):
+        self.config = config
+        self.address = (config.tello_ip, config.command_port)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.command_router: Optional[tello_command.DatagramRouter] = None
+        self.state_router: Optional[tello_command.DatagramRouter] = None
+        self.channel: Optional[tello_command.CommandChannel] = None
+        self.state: Dict[str, str] = {}
+        self.last_state_time = 0.0
+        self.state_received: Optional[asyncio.Event] = None
+        self.frame_reader: Optional[FrameReader] = None
+        self.owns_routers = True
+        self.route_key = None
+        self.is_flying = False
+        self.stream_on = False
+        self.logger = logging.getLogger(__name__)
+
+    async def connect(self, command_router: Optional[tello_command.DatagramRouter] = None,
+                      state_router: Optional[tello_command.DatagramRouter] = None,
+                      route_key=None):
+        """
+        Open the command and state endpoints and put the drone into SDK mode.
+
+        Args:
+            command_router, state_router: Endpoints shared with other drones, opened here if None
+            route_key: Source the drone's datagrams are routed by, its ip unless several share one
+        """
+        self.loop = asyncio.get_running_loop()
+        self.state_received = asyncio.Event()
+        self.route_key = route_key or self.config.tello_ip
+
+        self.owns_routers = command_router is None
+        if self.owns_routers:
+            # Replies come back to whatever port we send from, so let the OS pick one
+            _, command_router = await self.loop.create_datagram_endpoint(
+                tello_command.DatagramRouter, local_addr=('0.0.0.0', 0))
+            _, state_router = await self.loop.create_datagram_endpoint(
+                tello_command.DatagramRouter, local_addr=('0.0.0.0', self.config.state_port))
+        self.command_router = command_router
+        self.state_router = state_router
+
+        self.channel = tello_command.CommandChannel(
+            lambda data: self.command_router.transport.sendto(data, self.address), self.config.command)
+        self.command_router.add_handler(self.route_key, lambda data, addr: self.channel.handle_reply(data))
+        self.state_router.add_handler(self.route_key, self._handle_state)
+
+        await self.control_command('command')
+        await asyncio.wait_for(self.state_received.wait(), self.config.state_timeout)
+        self.logger.info(f"Connected to Tello at {self.config.tello_ip}")
+
+    def _handle_state(self, data: bytes, addr):
+        self.state = tello_command.parse_state(data)
+        self.last_state_time = time.monotonic()
+        self.state_received.set()
+
+    def _send_raw(self, command: str):
+        self.channel.send_unacked(command)
+
+    async def command(self, command: str, timeout: Optional[float] = None) -> tello_command.CommandResult:
+        """Send a command through the pipelined channel and wait for its reply"""
+        return await self.channel.execute(command, timeout)
+
+    async def control_command(self, command: str, timeout: Optional[float] = None) -> tello_command.CommandResult:
+        """Send a command and raise if the drone doesn't reply 'ok'"""
+        result = await self.command(command, timeout)
+        if not result.ok:
+            raise Exception(f"Command '{command}' failed: {result.response}")
+        return result
+
+    async def query(self, command: str, timeout: Optional[float] = None) -> str:
+        """Send a read command such as 'battery?' and return the value"""
+        result = await self.control_command(command, timeout)
+        return result.response
+
+    def submit_command(self, command: str):
+        """Issue a command from a worker thread without waiting, returns a concurrent.futures.Future"""
+        return self.channel.submit_threadsafe(command, self.loop)
+
+    def _run_blocking(self, command: str):
+        if self.loop is None:
+            raise Exception("AsyncTello is not connected")
+        try:
+            in_loop_thread = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop_thread = False
+        if in_loop_thread:
+            raise RuntimeError(f"Blocking '{command}' called from the event loop, await control_command instead")
+
+        future = asyncio.run_coroutine_threadsafe(self.control_command(command), self.loop)
+        channel_config = self.config.command
+        future.result((channel_config.retries + 1) * channel_config.timeout + 1.0)
+
+    # djitellopy.Tello compatible interface
+
+    def send_rc_control(self, left_right_velocity: int, forward_backward_velocity: int,
+                        up_down_velocity: int, yaw_velocity: int):
+        values = (int(np.clip(v, -100, 100)) for v in
+                  (left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity))
+        self.loop.call_soon_threadsafe(self._send_raw, 'rc {} {} {} {}'.format(*values))
+
+    def takeoff(self):
+        self._run_blocking('takeoff')
+        self.is_flying = True
+
+    def land(self):
+        self._run_blocking('land')
+        self.is_flying = False
+
+    def flip_left(self):
+        self._run_blocking('flip l')
+
+    def flip_right(self):
+        self._run_blocking('flip r')
+
+    def flip_forward(self):
+        self._run_blocking('flip f')
+
+    def flip_back(self):
+        self._run_blocking('flip b')
+
+    def streamon(self):
+        self._run_blocking('streamon')
+        self.stream_on = True
+
+    def get_state_field(self, key: str) -> int:
+        return int(float(self.state.get(key, 0)))
+
+    def get_battery(self) -> int:
+        return self.get_state_field('bat')
+
+    def get_height(self) -> int:
+        return self.get_state_field('h')
+
+    def get_yaw(self) -> int:
+        return self.get_state_field('yaw')
+
+    def get_speed_x(self) -> int:
+        return self.get_state_field('vgx')
+
+    def get_speed_y(self) -> int:
+        return self.get_state_field('vgy')
+
+    def get_speed_z(self) -> int:
+        return self.get_state_field('vgz')
+
+    def get_frame_read(self) -> FrameReader:
+        if self.frame_reader is None:
+            self.frame_reader = FrameReader(self.config.video_address)
+        return self.frame_reader
+
+    async def close(self):
+        """Stop the drone moving, land if airborne and release the endpoints"""
+        try:
+            if self.channel is not None:
+                self._send_raw('rc 0 0 0 0')
+                if self.is_flying:
+                    await self.control_command('land')
+                    self.is_flying = False
+                if self.stream_on:
+                    await self.control_command('streamoff')
+                    self.stream_on = False
+        except Exception as e:
+            self.logger.error(f"Error during shutdown: {e}")
+        finally:
+            if self.frame_reader is not None:
+                self.frame_reader.stop()
+                self.frame_reader = None
+            for router in (self.command_router, self.state_router):
+                if router is None:
+                    continue
+                if self.owns_routers:
+                    if router.transport is not None:
+                        router.transport.close()
+                else:
+                    router.remove_handler(self.route_key)
+            if self.channel is not None:
+                stats = self.channel.latency_stats()
+                if stats:
+                    self.logger.info(f"Command latency: {stats}")
+            self.command_router = None
+            self.state_router = None
+            self.channel = None
+
+
+class AsyncRuntime:
+    """
+    Runs the controller as fixed-rate asyncio tasks instead of the busy main loop.
+
+    UI and video ticks run on the event loop, the DroneController tick runs on a single
+    worker thread (it may block, e.g. safe_takeoff's stabilisation wait) and face
+    detection runs in its own executor.
+    """
+    def __init__(self, config: AsyncRuntimeConfig = AsyncRuntimeConfig(),
+                 controller: tello_keyboard.DroneController = tello_keyboard.drone_controller,
+                 video_manager: tello_video.VideoManager = tello_video.video_manager):
+        self.config = config
+        self.controller = controller
+        self.video_manager = video_manager
+        self.drone: Optional[AsyncTello] = None
+        self.stop_event: Optional[asyncio.Event] = None
+        self.control_executor: Optional[ThreadPoolExecutor] = None
+        self.detection_executor: Optional[ThreadPoolExecutor] = None
+        self.watchdog: Optional[tello_watchdog.Watchdog] = None
+        self.overruns: Dict[str, int] = {}
+        self.logger = logging.getLogger(__name__)
+
+    async def _run_periodic(self, name: str, rate: float, tick: Callable):
+        """Call tick at a fixed rate, skipping missed ticks rather than bursting to catch up"""
+        loop = asyncio.get_running_loop()
+        period = 1.0 / rate
+        next_tick = loop.time()
+        self.overruns[name] = 0
+        while True:
+            try:
+                await tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"{name} tick failed: {e}")
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.overruns[name] += 1
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def _ui_tick(self):
+        if not tello_pygame.update_pygame():
+            self.stop_event.set()
+
+    async def _video_tick(self):
+        if self.drone.get_frame_read().frame is not None:
+            self.video_manager.update_stream(self.drone)
+
+    async def _control_tick(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.control_executor, self.controller.update_controls, self.drone)
+        if self.video_manager.hud is not None:
+            self.video_manager.hud.update_telemetry(self.drone, self.controller)
+
+    async def _detection_tick(self):
+        frame = self.drone.get_frame_read().frame
+        if frame is None:
+            return
+        loop = asyncio.get_running_loop()
+        # Tracking and the mission's face search read the result instead of detecting in the control tick
+        self.controller.detected_face = await loop.run_in_executor(
+            self.detection_executor, self.controller.find_target_face, frame)
+
+    async def run(self):
+        """Connect, run the periodic tasks until the window is closed, then shut down cleanly"""
+        self.stop_event = asyncio.Event()
+        self.control_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tello-control')
+        self.detection_executor = ThreadPoolExecutor(max_workers=self.config.detection_workers,
+                                                     thread_name_prefix='tello-detect')
+        self.drone = AsyncTello(self.config)
+        tasks = []
+        try:
+            await self.drone.connect()
+            # Start the stream and read the battery at the same time instead of one after the other
+            battery, _ = await asyncio.gather(self.drone.query('battery?'),
+                                              self.drone.control_command('streamon'))
+            self.drone.stream_on = True
+            battery = int(battery)
+            self.logger.info(f"Battery level: {battery}%")
+            if battery < self.controller.config.min_battery_level:
+                raise Exception(f'Battery level too low: {battery}%')
+
+            self.watchdog = tello_watchdog.Watchdog(self.drone, self.controller)
+            self.controller.watchdog = self.watchdog
+            self.video_manager.register_frame_processor(self.watchdog.frame_received)
+            self.watchdog.start()
+
+            tello_pygame.initialise_pygame()
+            self.video_manager.attach_hud(tello_hud.Hud(tello_pygame.get_dimensions()))
+            self.controller.input_backend.start()
+            self.controller.detection_task_active = True
+            tasks = [
+                asyncio.create_task(self._run_periodic('ui', self.config.ui_rate, self._ui_tick)),
+                asyncio.create_task(self._run_periodic('video', self.config.video_rate, self._video_tick)),
+                asyncio.create_task(self._run_periodic('control', self.config.control_rate, self._control_tick)),
+                asyncio.create_task(self._run_periodic('detection', self.config.detection_rate, self._detection_tick)),
+            ]
+            await self.stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Let an in-flight controller tick finish before the link goes away. Wait off the
+            # loop thread, the tick may itself be waiting on a command reply from the loop
+            await asyncio.to_thread(self.control_executor.shutdown, wait=True)
+            await asyncio.to_thread(self.detection_executor.shutdown, wait=True)
+            self.controller.detection_task_active = False
+            self.controller.detected_face = None
+            if self.watchdog is not None:
+                # Off the loop thread too, a failsafe landing waits on the loop for its reply
+                await asyncio.to_thread(self.watchdog.stop)
+            await self.drone.close()
+            self.controller.input_backend.stop()
+            tello_pygame.quit_pygame()
+            if any(self.overruns.values()):
+                self.logger.info(f"Tick overruns: {self.overruns}")
+            if self.video_manager.motion_gate is not None:
+                self.logger.info(f"Motion gate: {self.video_manager.motion_gate.stats()}")
+
+
+def run_tello_async(config: AsyncRuntimeConfig = AsyncRuntimeConfig()):
+    asyncio.run(AsyncRuntime(config).run())
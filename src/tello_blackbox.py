@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+import logging
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class BlackBoxConfig:
+    """Configuration for the in-memory flight recorder"""
+    capacity: int = 16384  # Events kept, several seconds at the control loop's event rate
+    window: float = 30.0  # Seconds of history written out by a dump
+    dump_dir: Path = Path('./Logs/BlackBox')
+    min_dump_interval: float = 5.0  # Seconds, stops a held key or a failing loop spamming dumps
+    log_level: int = logging.INFO  # Log records at or above this level are recorded too
+
+
+class BlackBox:
+    """
+    Preallocated ring buffer of structured events: log records, commands sent and timings.
+
+    record() only stores the kind, the message template and its arguments in the next slot,
+    nothing is formatted until a dump, so it is cheap enough to call on every control tick.
+    Slots are claimed with an itertools.count, which is atomic under the GIL, so threads
+    record without a lock.
+    """
+    def __init__(self, config: BlackBoxConfig = BlackBoxConfig()):
+        self.config = config
+        self.times = np.zeros(config.capacity, dtype=np.float64)
+        self.seqs = np.full(config.capacity, -1, dtype=np.int64)
+        self.kinds = [''] * config.capacity
+        self.messages = [''] * config.capacity
+        self.args = [()] * config.capacity
+        self.counter = itertools.count()
+        self.start_wall = time.time()
+        self.start_monotonic = time.monotonic()
+        self.last_dump = -float('inf')
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, kind: str, message: str, *args):
+        """Store an event, message is a %-style template formatted with args at dump time"""
+        self._store(kind, message, args)
+
+    def _store(self, kind: str, message: str, args):
+        seq = next(self.counter)
+        slot = seq % self.config.capacity
+        self.seqs[slot] = -1  # Marks the slot as being written for _snapshot
+        self.kinds[slot] = kind
+        self.messages[slot] = message
+        self.args[slot] = args
+        self.times[slot] = time.monotonic()
+        self.seqs[slot] = seq
+
+    def timing(self, name: str, seconds: float):
+        self.record('timing', '%s %.2fms', name, 1000 * seconds)
+
+    def _snapshot(self) -> tuple:
+        # Plain copies are quick, formatting can then happen away from the control loop.
+        # Slots whose seq changed while copying were being rewritten and are dropped.
+        seqs = self.seqs.copy()
+        copies = (self.times.copy(), list(self.kinds), list(self.messages), list(self.args))
+        seqs[seqs != self.seqs] = -1
+        return (time.monotonic(), seqs) + copies
+
+    def _format(self, snapshot: tuple, window: float) -> list:
+        now, seqs, times, kinds, messages, args = snapshot
+        events = []
+        for slot in np.argsort(seqs):
+            if seqs[slot] < 0 or times[slot] < now - window:
+                continue
+            try:
+                text = messages[slot] % args[slot] if args[slot] else messages[slot]
+            except (TypeError, ValueError):
+                text = f"{messages[slot]} {args[slot]!r}"
+            events.append({
+                'seq': int(seqs[slot]),
+                'time': round(self.start_wall + times[slot] - self.start_monotonic, 4),
+                'kind': kinds[slot],
+                'message': text,
+            })
+        return events
+
+    def events(self, window: Optional[float] = None) -> list:
+        """Recorded events from the last window seconds, oldest first, formatted"""
+        return self._format(self._snapshot(), self.config.window if window is None else window)
+
+    def dump(self, reason: str, background: bool = False, force: bool = False) -> Optional[Path]:
+        """
+        Write recent events to a JSON-lines file in dump_dir.
+
+        Args:
+            reason: Why the dump happened, goes in the file name and first line
+            background: Format and write from a separate thread so the caller only pays for a copy
+            force: Ignore min_dump_interval (exit and crash dumps)
+
+        Returns:
+            Path: File written to, or None if the dump was skipped
+        """
+        now = time.monotonic()
+        if not force and now - self.last_dump < self.config.min_dump_interval:
+            return None
+        self.last_dump = now
+
+        snapshot = self._snapshot()
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        path = self.config.dump_dir / f"{stamp}_{reason.replace(' ', '_')}.jsonl"
+        if background:
+            threading.Thread(target=self._write, args=(path, reason, snapshot), daemon=True).start()
+        else:
+            self._write(path, reason, snapshot)
+        return path
+
+    def _write(self, path: Path, reason: str, snapshot: tuple):
+        try:
+            events = self._format(snapshot, self.config.window)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'reason': reason, 'events': len(events)}) + '\n')
+                for event in events:
+                    f.write(json.dumps(event, default=str) + '\n')
+            self.logger.info(f"Black box written to {path}")
+        except OSError as e:
+            self.logger.error(f"Failed to write black box: {e}")
+
+
+class BlackBoxHandler(logging.Handler):
+    """Logging handler feeding records into a BlackBox without formatting them"""
+    def __init__(self, black_box: BlackBox, level: int = logging.INFO):
+        super().__init__(level)
+        self.black_box = black_box
+
+    def emit(self, record: logging.LogRecord):
+        message = f"{record.name}: {record.msg}" if isinstance(record.msg, str) else str(record.msg)
+        if record.exc_info and record.exc_info[1] is not None:
+            message += f" [{record.exc_info[0].__name__}: {record.exc_info[1]}]"
+        self.black_box._store(record.levelname.lower(), message, record.args or ())
+
+
+_installed = False
+
+
+def install(box: Optional[BlackBox] = None):
+    """
+    Record log records into the black box and dump it on uncaught exceptions and at exit.
+    Safe to call more than once.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    box = box or black_box
+    logging.getLogger().addHandler(BlackBoxHandler(box, box.config.log_level))
+
+    previous_hook = sys.excepthook
+
+    def excepthook(exc_type, exc, tb):
+        box.record('exception', '%s: %s', exc_type.__name__, exc)
+        box.dump('exception', force=True)
+        previous_hook(exc_type, exc, tb)
+
+    sys.excepthook = excepthook
+    atexit.register(box.dump, 'exit', force=True)
+
+
+# Create global instance
+black_box = BlackBox()
+record = black_box.record
+dump = black_box.dump
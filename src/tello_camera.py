@@ -0,0 +1,205 @@
+import numpy as np
+import cv2
+import json
+import math
+import argparse
+import logging
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class CameraConfig:
+    """Configuration for the camera model used to turn pixels into angles and distances"""
+    calibration_path: Path = Path('data/camera/tello.json')
+    # Used until a calibration exists: the Tello streams 960x720 with an 82.6 degree diagonal field of view
+    default_size: Tuple[int, int] = (960, 720)
+    default_horizontal_fov: float = 70.0  # Degrees
+    # Control gains were tuned on 1280 wide frames, pixel errors are rescaled to this width's focal length
+    reference_width: int = 1280
+    face_width: float = 16.0  # cm, typical width of a cascade face box on a real face
+
+
+class CameraModel:
+    """
+    Pinhole intrinsics plus distortion for one image size.
+
+    for_size() rescales the model to other resolutions, so the same calibration serves
+    the full stream, the display size and downscaled detection frames.
+    """
+    def __init__(self, camera_matrix: np.ndarray, dist_coeffs: np.ndarray, image_size: Tuple[int, int],
+                 config: CameraConfig = CameraConfig()):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = tuple(int(v) for v in image_size)
+        self.config = config
+        self._scaled: Dict[Tuple[int, int], 'CameraModel'] = {}
+        self._maps: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_fov(cls, image_size: Tuple[int, int], horizontal_fov: float,
+                 config: CameraConfig = CameraConfig()) -> 'CameraModel':
+        """Distortion-free model with square pixels and the principal point at the centre"""
+        width, height = image_size
+        focal = (width / 2) / math.tan(math.radians(horizontal_fov) / 2)
+        matrix = np.array([[focal, 0, width / 2], [0, focal, height / 2], [0, 0, 1]])
+        return cls(matrix, np.zeros(5), image_size, config)
+
+    @property
+    def fx(self) -> float:
+        return self.camera_matrix[0, 0]
+
+    @property
+    def fy(self) -> float:
+        return self.camera_matrix[1, 1]
+
+    @property
+    def cx(self) -> float:
+        return self.camera_matrix[0, 2]
+
+    @property
+    def cy(self) -> float:
+        return self.camera_matrix[1, 2]
+
+    @property
+    def reference_fx(self) -> float:
+        """Focal length of a reference_width frame, independent of the calibration"""
+        fov = math.radians(self.config.default_horizontal_fov)
+        return (self.config.reference_width / 2) / math.tan(fov / 2)
+
+    def for_size(self, width: int, height: int) -> 'CameraModel':
+        """This model rescaled to frames of width x height, cached per size"""
+        size = (int(width), int(height))
+        if size == self.image_size:
+            return self
+        scaled = self._scaled.get(size)
+        if scaled is None:
+            sx = size[0] / self.image_size[0]
+            sy = size[1] / self.image_size[1]
+            matrix = self.camera_matrix.copy()
+            matrix[0] *= sx
+            matrix[1] *= sy
+            scaled = self._scaled[size] = CameraModel(matrix, self.dist_coeffs, size, self.config)
+        return scaled
+
+    def undistort_maps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Remap tables for undistorting whole frames, computed once"""
+        if self._maps is None:
+            self._maps = cv2.initUndistortRectifyMap(self.camera_matrix, self.dist_coeffs, None,
+                                                     self.camera_matrix, self.image_size, cv2.CV_16SC2)
+        return self._maps
+
+    def undistort(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        model = self.for_size(width, height)
+        if not model.dist_coeffs.any():
+            return frame
+        map1, map2 = model.undistort_maps()
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+
+    def bearing(self, x: float) -> float:
+        """Horizontal angle of image column x from the optical axis, degrees, positive to the right"""
+        return math.degrees(math.atan2(x - self.cx, self.fx))
+
+    def reference_pixels(self, x: float) -> float:
+        """Horizontal offset of x from the principal point, in pixels of a reference_width frame"""
+        return (x - self.cx) * self.reference_fx / self.fx
+
+    def face_distance(self, face_width_px: float) -> float:
+        """Distance to a face from the width of its box, cm"""
+        return self.fx * self.config.face_width / max(face_width_px, 1.0)
+
+    def to_dict(self) -> dict:
+        return {
+            'image_size': list(self.image_size),
+            'camera_matrix': self.camera_matrix.tolist(),
+            'dist_coeffs': self.dist_coeffs.tolist(),
+        }
+
+    def save(self, path: Path, **extra):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({**self.to_dict(), **extra}, indent=2))
+
+    @classmethod
+    def load(cls, path: Path, config: CameraConfig = CameraConfig()) -> 'CameraModel':
+        data = json.loads(Path(path).read_text())
+        return cls(data['camera_matrix'], data['dist_coeffs'], data['image_size'], config)
+
+
+def load_camera_model(config: CameraConfig = CameraConfig()) -> CameraModel:
+    """The calibrated model if one has been saved, otherwise one built from the nominal field of view"""
+    if Path(config.calibration_path).exists():
+        try:
+            return CameraModel.load(config.calibration_path, config)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Failed to load camera calibration {config.calibration_path}: {e}")
+    return CameraModel.from_fov(config.default_size, config.default_horizontal_fov, config)
+
+
+def calibrate(images: List[Path], pattern: Tuple[int, int] = (9, 6), square_size: float = 2.5,
+              config: CameraConfig = CameraConfig()) -> Tuple[CameraModel, float]:
+    """
+    Calibrate from photos of a checkerboard taken with the drone's camera.
+
+    Args:
+        images: Photos of the board from different angles, all the same size
+        pattern: Inner corners per row and column
+        square_size: Side of a square, cm
+
+    Returns:
+        tuple: (CameraModel, RMS reprojection error in pixels)
+    """
+    board = np.zeros((pattern[0] * pattern[1], 3), np.float32)
+    board[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2) * square_size
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+    object_points, image_points = [], []
+    image_size = None
+    for path in images:
+        img = cv2.imread(str(path))
+        if img is None:
+            logging.warning(f"Could not read {path}")
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        size = gray.shape[::-1]
+        if image_size is not None and size != image_size:
+            logging.warning(f"Skipping {path}, it is {size} not {image_size}")
+            continue
+        found, corners = cv2.findChessboardCorners(gray, pattern, None)
+        if not found:
+            logging.warning(f"No checkerboard found in {path}")
+            continue
+        image_size = size
+        object_points.append(board)
+        image_points.append(cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria))
+
+    if len(object_points) < 3:
+        raise ValueError(f"Checkerboard found in {len(object_points)} images, need at least 3")
+    rms, matrix, dist, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+    logging.info(f"Calibrated from {len(object_points)} images, RMS error {rms:.3f}px")
+    return CameraModel(matrix, dist, image_size, config), rms
+
+
+def parse_pattern(text: str) -> Tuple[int, int]:
+    columns, _, rows = text.partition('x')
+    return int(columns), int(rows)
+
+
+# Create global instance
+camera_model = load_camera_model()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calibrate the drone camera from checkerboard photos")
+    parser.add_argument('images', nargs='+', type=Path, help="photos of the checkerboard (press z while flying)")
+    parser.add_argument('--pattern', type=parse_pattern, default=(9, 6), help="inner corners, e.g. 9x6")
+    parser.add_argument('--square', type=float, default=2.5, help="square size in cm")
+    parser.add_argument('--output', type=Path, default=CameraConfig.calibration_path)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model, rms = calibrate(args.images, args.pattern, args.square)
+    model.save(args.output, rms=rms)
+    print(f"Saved {args.output}: fx {model.fx:.1f} fy {model.fy:.1f} centre ({model.cx:.1f}, {model.cy:.1f})")
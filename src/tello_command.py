@@ -0,0 +1,266 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Tuple
+import tello_blackbox
+
+TELLO_IP = '192.168.10.1'
+TELLO_COMMAND_PORT = 8889
+TELLO_STATE_PORT = 8890
+TELLO_VIDEO_ADDRESS = 'udp://@0.0.0.0:11111'
+
+# Commands that answer with a value instead of ok/error
+QUERY_SUFFIX = '?'
+
+
+@dataclass
+class CommandChannelConfig:
+    """Configuration for the pipelined SDK command channel"""
+    timeout: float = 7.0  # Seconds to wait for each reply
+    retries: int = 2  # Extra attempts after a timeout or error reply
+    max_in_flight: int = 3  # Commands sent but not yet answered
+    latency_window: int = 100  # Round-trip samples kept per command
+
+
+@dataclass
+class CommandResult:
+    """Outcome of one SDK command"""
+    seq: int
+    command: str
+    response: str
+    latency: float  # Seconds from the last send to its reply
+    attempts: int
+
+    @property
+    def ok(self) -> bool:
+        if self.command.endswith(QUERY_SUFFIX):
+            return not self.response.lower().startswith('error')
+        return self.response.lower() == 'ok'
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+def reply_matches(command: str, response: str) -> bool:
+    """Whether response is the kind of reply command gets: a value for queries, ok otherwise, error for either"""
+    lowered = response.lower()
+    if lowered.startswith('error'):
+        return True
+    if command.endswith(QUERY_SUFFIX):
+        return lowered != 'ok'
+    return lowered == 'ok'
+
+
+def parse_state(data: bytes) -> Dict[str, str]:
+    """Parse a Tello state packet ("pitch:0;roll:0;...;bat:87;...") into a dict"""
+    state = {}
+    for item in data.decode('ascii', errors='ignore').strip().split(';'):
+        key, sep, value = item.partition(':')
+        if sep:
+            state[key] = value
+    return state
+
+
+class DatagramRouter(asyncio.DatagramProtocol):
+    """
+    Dispatches received datagrams to handlers registered per source address.
+    Handlers can be registered for an exact (ip, port) or for every port of an ip.
+    """
+    def __init__(self):
+        self.transport = None
+        self.handlers: Dict[object, Callable] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def add_handler(self, source, handler: Callable[[bytes, Tuple[str, int]], None]):
+        self.handlers[source] = handler
+
+    def remove_handler(self, source):
+        self.handlers.pop(source, None)
+
+    def datagram_received(self, data: bytes, addr):
+        handler = self.handlers.get(addr[:2]) or self.handlers.get(addr[0])
+        if handler is not None:
+            handler(data, addr)
+        else:
+            self.logger.debug("Dropping datagram from unknown source %s", addr)
+
+    def error_received(self, exc):
+        self.logger.warning(f"UDP error: {exc}")
+
+
+class _PendingCommand:
+    def __init__(self, seq: int, command: str, future: asyncio.Future):
+        self.seq = seq
+        self.command = command
+        self.future = future
+        self.sent_time = time.monotonic()
+
+
+def command_name(command: str) -> str:
+    """Key used for latency statistics, e.g. 'flip l' -> 'flip'"""
+    return command.split(' ', 1)[0]
+
+
+class CommandChannel:
+    """
+    Issues SDK commands over a datagram transport with a bounded number in flight.
+
+    The Tello answers commands strictly in order and replies carry no id, so replies are
+    matched to the oldest outstanding command that expects that kind of reply (ok for
+    commands, a value for queries, error for either). Commands skipped over had their
+    datagram lost and fail at once so they are retried. A command that times out leaves
+    the queue straight away; if its reply turns up late after all and doesn't fit the new
+    head, it is dropped as a stray rather than skipping the head.
+    """
+    def __init__(self, send: Callable[[bytes], None],
+                 config: CommandChannelConfig = CommandChannelConfig()):
+        self.send = send
+        self.config = config
+        self.in_flight = asyncio.Semaphore(config.max_in_flight)
+        self.pending: Deque[_PendingCommand] = deque()
+        self.next_seq = 0
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.timeouts = 0
+        self.unmatched_replies = 0
+        self.stray_replies = 0  # Replies dropped because they fitted no outstanding command
+        self.late_replies = 0  # Timed out commands whose reply may still arrive
+        self.logger = logging.getLogger(__name__)
+
+    def handle_reply(self, data: bytes):
+        """Feed a datagram received from the drone's command port"""
+        now = time.monotonic()
+        if not self.pending:
+            self.unmatched_replies += 1
+            self.late_replies = max(0, self.late_replies - 1)
+            self.logger.debug("Reply with no command outstanding: %r", data)
+            return
+
+        response = data.decode('utf-8', errors='ignore').strip()
+        match = next((i for i, entry in enumerate(self.pending) if reply_matches(entry.command, response)), None)
+        if match != 0 and (match is None or self.late_replies > 0):
+            # Out of step, most likely the late reply of a command that already timed out
+            self.late_replies = max(0, self.late_replies - 1)
+            self._stray(response)
+            return
+
+        # Replies come back in order, so the commands before the match never reached the drone
+        for _ in range(match):
+            lost = self.pending.popleft()
+            self.timeouts += 1
+            if not lost.future.done():
+                lost.future.set_exception(CommandTimeout(f"Reply to '{lost.command}' lost"))
+        entry = self.pending.popleft()
+        if not entry.future.done():
+            entry.future.set_result((response, now - entry.sent_time))
+
+    def _stray(self, response: str):
+        self.stray_replies += 1
+        waiting = self.pending[0].command if self.pending else None
+        self.logger.warning(f"Dropping reply '{response}' that fits no outstanding command (oldest is {waiting})")
+        tello_blackbox.record('command', "stray reply '%s' while waiting on %s", response, waiting)
+
+    def _forget(self, entry: _PendingCommand):
+        try:
+            self.pending.remove(entry)
+        except ValueError:
+            pass
+
+    def send_unacked(self, command: str):
+        """Send a command the drone doesn't answer, such as rc"""
+        self.send(command.encode('utf-8'))
+
+    async def _attempt(self, command: str, timeout: float):
+        async with self.in_flight:
+            loop = asyncio.get_running_loop()
+            entry = _PendingCommand(self.next_seq, command, loop.create_future())
+            self.next_seq += 1
+            self.pending.append(entry)
+            self.send(command.encode('utf-8'))
+            try:
+                response, latency = await asyncio.wait_for(entry.future, timeout)
+                return entry.seq, response, latency
+            except asyncio.TimeoutError:
+                self._forget(entry)
+                self.late_replies += 1
+                self.timeouts += 1
+                raise CommandTimeout(f"No reply to '{command}' within {timeout:.1f}s")
+            except asyncio.CancelledError:
+                if entry in self.pending:
+                    self._forget(entry)
+                    self.late_replies += 1
+                raise
+
+    async def execute(self, command: str, timeout: Optional[float] = None,
+                      retries: Optional[int] = None) -> CommandResult:
+        """
+        Send a command and wait for its reply, retrying on timeout or error replies.
+
+        Returns:
+            CommandResult: The last attempt's result, check .ok for error replies
+
+        Raises:
+            CommandTimeout: If every attempt timed out
+        """
+        timeout = timeout or self.config.timeout
+        retries = self.config.retries if retries is None else retries
+        result = None
+        for attempt in range(1, retries + 2):
+            try:
+                seq, response, latency = await self._attempt(command, timeout)
+            except CommandTimeout:
+                if attempt > retries:
+                    raise
+                self.logger.warning(f"'{command}' timed out, retrying ({attempt}/{retries})")
+                continue
+
+            self._record_latency(command, latency)
+            tello_blackbox.record('command', "'%s' -> '%s' in %.1fms", command, response, 1000 * latency)
+            result = CommandResult(seq, command, response, latency, attempt)
+            if result.ok:
+                break
+            self.logger.warning(f"'{command}' failed with '{response}' (attempt {attempt})")
+        return result
+
+    def submit(self, command: str, callback: Optional[Callable[[CommandResult], None]] = None,
+               timeout: Optional[float] = None, retries: Optional[int] = None) -> asyncio.Task:
+        """Issue a command without waiting, optionally calling back with its result"""
+        task = asyncio.ensure_future(self.execute(command, timeout, retries))
+        if callback is not None:
+            def _done(finished: asyncio.Task):
+                if not finished.cancelled() and finished.exception() is None:
+                    callback(finished.result())
+            task.add_done_callback(_done)
+        return task
+
+    def submit_threadsafe(self, command: str, loop: asyncio.AbstractEventLoop,
+                          timeout: Optional[float] = None, retries: Optional[int] = None):
+        """Issue a command from another thread, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self.execute(command, timeout, retries), loop)
+
+    def _record_latency(self, command: str, latency: float):
+        name = command_name(command)
+        samples = self.latencies.get(name)
+        if samples is None:
+            samples = self.latencies[name] = deque(maxlen=self.config.latency_window)
+        samples.append(latency)
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Round-trip latency per command name in milliseconds"""
+        stats = {}
+        for name, samples in self.latencies.items():
+            ordered = sorted(samples)
+            count = len(ordered)
+            stats[name] = {
+                'count': count,
+                'mean_ms': 1000 * sum(ordered) / count,
+                'p50_ms': 1000 * ordered[count // 2],
+                'p95_ms': 1000 * ordered[min(count - 1, int(count * 0.95))],
+                'max_ms': 1000 * ordered[-1],
+            }
+        return stats
@@ -0,0 +1,181 @@
+import numpy as np
+import cv2
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+
+@dataclass
+class FrameCacheConfig:
+    """Configuration for the per-frame derived image cache"""
+    slots: int = 3  # Frames kept before the oldest slot is reused
+    pyramid_levels: int = 4  # Levels below full-size gray, each half the size of the one above
+
+
+class DerivedFrame:
+    """
+    A frame plus grayscale, equalized and pyramid images computed from it on first use.
+    Buffers are reused when the cache slot moves on to a newer frame, unless a reader in
+    another thread holds a lease(); the slot then gets a new entry and the leased one is
+    left untouched for its reader.
+    """
+    def __init__(self, pyramid_levels: int):
+        self.lock = threading.Lock()
+        self.seq = -1
+        self.frame: Optional[np.ndarray] = None
+        self.source: Optional[np.ndarray] = None  # Array frame was made from, the raw decoder output
+        self.timestamp = 0.0
+        self.pyramid_levels = pyramid_levels
+        self._gray: Optional[np.ndarray] = None
+        self._equalized: Optional[np.ndarray] = None
+        self._pyramid: List[Optional[np.ndarray]] = [None] * pyramid_levels
+        self._have_gray = False
+        self._have_equalized = False
+        self._have_levels = 0
+        self.leases = 0  # Readers in other threads still using this frame's images
+
+    def _reset(self, seq: int, frame: np.ndarray, source: Optional[np.ndarray] = None) -> bool:
+        """Move this entry on to a new frame, False if it is leased and must be left alone"""
+        with self.lock:
+            if self.leases:
+                return False
+            if self.frame is not None and frame.shape[:2] != self.frame.shape[:2]:
+                # Resolution changed, the old buffers no longer fit
+                self._gray = None
+                self._equalized = None
+                self._pyramid = [None] * self.pyramid_levels
+            self.seq = seq
+            self.frame = frame
+            self.source = frame if source is None else source
+            self.timestamp = time.monotonic()
+            self._have_gray = False
+            self._have_equalized = False
+            self._have_levels = 0
+        return True
+
+    def holds(self, frame: np.ndarray) -> bool:
+        """Whether this entry is for frame, given either as the raw array or the transformed one"""
+        return self.frame is frame or self.source is frame
+
+    def is_current(self, seq: int) -> bool:
+        return self.seq == seq
+
+    @contextmanager
+    def lease(self) -> Iterator['DerivedFrame']:
+        """Hold while using this frame's images outside the thread that puts frames"""
+        with self.lock:
+            self.leases += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.leases -= 1
+
+    def _compute_gray(self) -> np.ndarray:
+        if not self._have_gray:
+            if self._gray is None:
+                self._gray = np.empty(self.frame.shape[:2], dtype=np.uint8)
+            cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            self._have_gray = True
+        return self._gray
+
+    def gray(self) -> np.ndarray:
+        """Full-size grayscale image"""
+        with self.lock:
+            return self._compute_gray()
+
+    def equalized(self) -> np.ndarray:
+        """Histogram-equalized grayscale image"""
+        with self.lock:
+            if not self._have_equalized:
+                gray = self._compute_gray()
+                if self._equalized is None:
+                    self._equalized = np.empty_like(gray)
+                cv2.equalizeHist(gray, dst=self._equalized)
+                self._have_equalized = True
+            return self._equalized
+
+    def pyramid(self, level: int) -> np.ndarray:
+        """Grayscale image halved level times with pyrDown, level 0 is the full-size gray"""
+        if not 0 <= level <= self.pyramid_levels:
+            raise ValueError(f"Pyramid level must be between 0 and {self.pyramid_levels}")
+        with self.lock:
+            current = self._compute_gray()
+            for index in range(level):
+                if index >= self._have_levels:
+                    if self._pyramid[index] is None:
+                        height, width = current.shape
+                        self._pyramid[index] = np.empty(((height + 1) // 2, (width + 1) // 2), dtype=np.uint8)
+                    cv2.pyrDown(current, dst=self._pyramid[index])
+                    self._have_levels = index + 1
+                current = self._pyramid[index]
+            return current
+
+
+class FrameCache:
+    """
+    Ring of DerivedFrame slots keyed by frame sequence number.
+
+    transform, if given, is applied once to each raw frame (e.g. undistortion) and entries
+    hold the result; they are still found by the raw array, so consumers handed the
+    decoder's frame get the transformed one and its images.
+    """
+    def __init__(self, config: FrameCacheConfig = FrameCacheConfig(),
+                 transform: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        self.config = config
+        self.transform = transform
+        self.entries = [DerivedFrame(config.pyramid_levels) for _ in range(config.slots)]
+        self.seq = -1
+
+    def _new_entry(self, seq: int, source: np.ndarray) -> DerivedFrame:
+        entry = DerivedFrame(self.config.pyramid_levels)
+        entry._reset(seq, self.transform(source) if self.transform is not None else source, source)
+        return entry
+
+    def put(self, source: np.ndarray) -> DerivedFrame:
+        """
+        Start a new frame, evicting the oldest one. The reader hands back the same array
+        until the next frame is decoded, that returns the existing entry instead.
+        """
+        latest = self.latest
+        if latest is not None and latest.source is source:
+            return latest
+        self.seq += 1
+        slot = self.seq % self.config.slots
+        frame = self.transform(source) if self.transform is not None else source
+        entry = self.entries[slot]
+        if not entry._reset(self.seq, frame, source):
+            entry = self.entries[slot] = DerivedFrame(self.config.pyramid_levels)
+            entry._reset(self.seq, frame, source)
+        return entry
+
+    def get(self, seq: int) -> Optional[DerivedFrame]:
+        entry = self.entries[seq % self.config.slots]
+        return entry if entry.seq == seq else None
+
+    def lookup(self, frame: np.ndarray) -> DerivedFrame:
+        """
+        The cached entry for this exact frame array, raw or transformed, so consumers that
+        were handed the raw frame still share its derived images. Frames not in the cache
+        get a throwaway entry.
+        """
+        for entry in self.entries:
+            if entry.holds(frame):
+                return entry
+        return self._new_entry(-1, frame)
+
+    @contextmanager
+    def borrow(self, frame: np.ndarray) -> Iterator[DerivedFrame]:
+        """lookup() plus a lease, for reading a frame's images from another thread"""
+        entry = self.lookup(frame)
+        with entry.lease():
+            if not entry.holds(frame):
+                # The slot moved on to a newer frame between the lookup and the lease
+                entry = self._new_entry(-1, frame)
+            yield entry
+
+    @property
+    def latest(self) -> Optional[DerivedFrame]:
+        return self.get(self.seq) if self.seq >= 0 else None
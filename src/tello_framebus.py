@@ -0,0 +1,274 @@
+import os
+import numpy as np
+import time
+import logging
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from dataclasses import dataclass
+from typing import Tuple, Optional, Callable
+
+# Header layout (int64 words) at the start of the shared block:
+#   [0] magic, [1] slot count, [2] height, [3] width, [4] channels,
+#   [5] latest published sequence number (-1 before the first frame), [6] producer pid,
+#   [7 .. 7 + slots] sequence number held by each slot (-1 while being written)
+FRAMEBUS_MAGIC = 0x54454C4C4F425553  # "TELLOBUS"
+HEADER_FIXED_WORDS = 7
+
+
+@dataclass
+class FrameBusConfig:
+    """Configuration for the shared-memory frame bus"""
+    name: str = 'tello_frames'
+    slots: int = 4  # Consumers get (slots - 1) frames of grace before a slot is reused
+    frame_height: int = 720  # The Tello streams 960x720, other sizes are rejected by publish()
+    frame_width: int = 960
+    channels: int = 3
+    poll_interval: float = 0.002  # Seconds between polls while waiting for a new frame
+
+
+def _header_words(slots: int) -> int:
+    return HEADER_FIXED_WORDS + slots
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Signal 0 is CTRL_C_EVENT there, and a block only outlives its last handle on
+        # POSIX, so one that still exists on Windows is in use
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    return True
+
+
+def _header_bytes(slots: int) -> int:
+    # Keep the frame slots 64-byte aligned
+    size = _header_words(slots) * 8
+    return (size + 63) // 64 * 64
+
+
+class _FrameRing:
+    """Views over a shared block laid out as header + ring of frame slots"""
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, shape: Tuple[int, int, int]):
+        self.shm = shm
+        self.slots = slots
+        self.shape = shape
+        self.header = np.ndarray((_header_words(slots),), dtype=np.int64, buffer=shm.buf)
+        self.slot_seqs = self.header[HEADER_FIXED_WORDS:]
+        self.frames = np.ndarray((slots, *shape), dtype=np.uint8,
+                                 buffer=shm.buf, offset=_header_bytes(slots))
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self.header[5])
+
+    def release(self):
+        # Drop our numpy views first, SharedMemory.close() refuses while they exist
+        self.header = None
+        self.slot_seqs = None
+        self.frames = None
+        self.shm.close()
+
+
+class FrameBus:
+    """
+    Single-producer side of the frame bus.
+
+    Frames are copied once into a preallocated ring of slots in shared memory;
+    consumers in other processes attach with FrameBusReader and read them in place.
+    """
+    def __init__(self, config: FrameBusConfig = FrameBusConfig()):
+        self.config = config
+        self.shape = (config.frame_height, config.frame_width, config.channels)
+        size = _header_bytes(config.slots) + config.slots * int(np.prod(self.shape))
+        try:
+            shm = shared_memory.SharedMemory(name=config.name, create=True, size=size)
+        except FileExistsError:
+            self._remove_stale(config.name)
+            shm = shared_memory.SharedMemory(name=config.name, create=True, size=size)
+
+        self.ring = _FrameRing(shm, config.slots, self.shape)
+        self.ring.header[:HEADER_FIXED_WORDS] = (FRAMEBUS_MAGIC, config.slots, *self.shape, -1, os.getpid())
+        self.ring.slot_seqs[:] = -1
+        self.seq = -1
+        self.consumers = []
+        logging.info(f"Frame bus '{config.name}' created: {config.slots} x {self.shape}")
+
+    @staticmethod
+    def _remove_stale(name: str):
+        """
+        Unlink a block left behind by a producer that did not shut down cleanly.
+        A bus whose producer is still running is never touched.
+        """
+        existing = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(existing._name, 'shared_memory')  # Not ours unless unlinked below
+        try:
+            header = np.ndarray((HEADER_FIXED_WORDS,), dtype=np.int64, buffer=existing.buf)
+            is_bus = header[0] == FRAMEBUS_MAGIC
+            producer = int(header[6])
+            del header
+        finally:
+            existing.close()
+        if not is_bus:
+            raise FileExistsError(f"Shared memory '{name}' exists and is not a frame bus")
+        if _pid_alive(producer):
+            raise FileExistsError(f"Frame bus '{name}' is in use by process {producer}")
+        logging.warning(f"Frame bus '{name}' was left behind by process {producer}, replacing it")
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    def publish(self, frame: np.ndarray) -> int:
+        """
+        Copy a frame into the next ring slot and publish it.
+
+        Args:
+            frame: Frame in the producer's pixel format, the same shape as the bus
+
+        Returns:
+            int: Sequence number assigned to the frame
+        """
+        if frame.shape != self.shape:
+            # Resizing here would cost a full-frame resample per publish, size the bus to the stream instead
+            raise ValueError(f"Frame shape {frame.shape} doesn't match the frame bus {self.shape}")
+        seq = self.seq + 1
+        index = seq % self.ring.slots
+
+        # Mark the slot as being written so readers holding it can tell it was recycled
+        self.ring.slot_seqs[index] = -1
+        np.copyto(self.ring.frames[index], frame)
+        self.ring.slot_seqs[index] = seq
+        self.ring.header[5] = seq
+
+        self.seq = seq
+        return seq
+
+    def frame(self, seq: int) -> Optional[np.ndarray]:
+        """
+        Copy of published frame seq, for matching a consumer's result to the frame it came from.
+
+        Returns:
+            np.ndarray: The frame, or None once its slot has been reused
+        """
+        if seq < 0 or self.ring is None:
+            return None
+        index = seq % self.ring.slots
+        if int(self.ring.slot_seqs[index]) != seq:
+            return None
+        return self.ring.frames[index].copy()
+
+    def start_consumer(self, target: Callable, *args) -> multiprocessing.Process:
+        """
+        Start a consumer process running target(bus_name, *args).
+        The target is expected to attach with FrameBusReader(bus_name).
+        """
+        process = multiprocessing.Process(target=target, args=(self.name, *args), daemon=True)
+        process.start()
+        self.consumers.append(process)
+        return process
+
+    def stop_consumers(self):
+        for process in self.consumers:
+            process.terminate()
+            process.join(timeout=1.0)
+        self.consumers = []
+
+    def close(self):
+        """Stop consumer processes and free the shared block"""
+        self.stop_consumers()
+
+        if self.ring is not None:
+            shm = self.ring.shm
+            self.ring.release()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                logging.warning(f"Frame bus '{self.name}' was already unlinked")
+            self.ring = None
+            logging.info(f"Frame bus '{self.name}' closed")
+
+
+class FrameBusReader:
+    """
+    Consumer side of the frame bus.
+
+    Frames are returned as read-only views into shared memory (zero-copy). A view stays
+    valid until the producer wraps around the ring; call is_current(seq) after processing
+    to check the frame wasn't overwritten while it was in use, or read with copy=True.
+    """
+    def __init__(self, name: str = FrameBusConfig.name, poll_interval: float = FrameBusConfig.poll_interval):
+        shm = shared_memory.SharedMemory(name=name)
+        # Python registers attached blocks with the resource tracker too and would unlink
+        # the producer's block when this process exits - only the producer owns it
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+        header = np.ndarray((HEADER_FIXED_WORDS,), dtype=np.int64, buffer=shm.buf)
+        if header[0] != FRAMEBUS_MAGIC:
+            shm.close()
+            raise Exception(f"Shared memory '{name}' is not a frame bus")
+        slots = int(header[1])
+        shape = (int(header[2]), int(header[3]), int(header[4]))
+        del header
+
+        self.name = name
+        self.poll_interval = poll_interval
+        self.ring = _FrameRing(shm, slots, shape)
+        self.ring.frames.flags.writeable = False
+        self.last_seq = -1
+        self.dropped_frames = 0
+
+    def is_current(self, seq: int) -> bool:
+        """Check that the slot holding frame seq has not been reused since it was read"""
+        return int(self.ring.slot_seqs[seq % self.ring.slots]) == seq
+
+    def read_latest(self, copy: bool = False) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Read the most recently published frame.
+
+        Returns:
+            tuple: (sequence_number, frame) or (-1, None) if nothing has been published
+        """
+        seq = self.ring.latest_seq
+        if seq < 0:
+            return -1, None
+
+        frame = self.ring.frames[seq % self.ring.slots]
+        if copy:
+            frame = frame.copy()
+        if not self.is_current(seq):
+            # Producer lapped us mid-read, the next published frame will do
+            return -1, None
+
+        if self.last_seq >= 0 and seq > self.last_seq + 1:
+            self.dropped_frames += seq - self.last_seq - 1
+        self.last_seq = seq
+        return seq, frame
+
+    def wait_for_frame(self, timeout: Optional[float] = None, copy: bool = False) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Block until a frame newer than the last one read is published.
+
+        Returns:
+            tuple: (sequence_number, frame) or (-1, None) on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.ring.latest_seq > self.last_seq:
+                seq, frame = self.read_latest(copy)
+                if frame is not None:
+                    return seq, frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return -1, None
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.release()
+            self.ring = None
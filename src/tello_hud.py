@@ -0,0 +1,153 @@
+import math
+import pygame
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Field name -> label, in display order
+FIELDS = {
+    'battery': 'BAT',
+    'height': 'ALT',
+    'fps': 'FPS',
+    'rc': 'RC',
+    'ttc': 'TTC',
+    'mode': 'MODE',
+}
+
+
+@dataclass
+class HudConfig:
+    """Layout and colours of the telemetry overlay"""
+    origin: Tuple[int, int] = (10, 10)  # Top left of the telemetry panel
+    font_size: int = 22
+    line_height: int = 20
+    label_width: int = 56
+    value_width: int = 170
+    padding: int = 6
+    text_colour: Tuple[int, int, int] = (255, 255, 255)
+    warning_colour: Tuple[int, int, int] = (255, 80, 80)
+    face_colour: Tuple[int, int, int] = (255, 0, 0)
+    panel_colour: Tuple[int, int, int, int] = (0, 0, 0, 120)
+    low_battery: int = 20  # % below which the battery is shown in the warning colour
+    mirror: bool = True  # update_stream shows the frame mirrored, face boxes have to match
+
+
+class Hud:
+    """
+    Telemetry and face boxes drawn on a transparent surface that is blitted over the video.
+
+    The panel background and labels are rendered once. Values are stored by set() from any
+    thread and only the fields whose value changed are re-rendered, on the UI thread, the
+    next time render() is called. Nothing is drawn on the video frames themselves.
+    """
+    def __init__(self, window_size: Tuple[int, int], config: HudConfig = HudConfig()):
+        self.config = config
+        self.window_size = window_size
+        self.font = pygame.font.Font(None, config.font_size)
+        self.overlay = pygame.Surface(window_size, pygame.SRCALPHA)
+        self.values: Dict[str, object] = {}
+        self.shown: Dict[str, object] = {}
+        self.faces: Optional[Tuple[np.ndarray, Tuple[int, int]]] = None
+        self.shown_faces = None
+        self.face_rects: List[pygame.Rect] = []
+
+        x, y = config.origin
+        width = config.label_width + config.value_width + 2 * config.padding
+        height = len(FIELDS) * config.line_height + 2 * config.padding
+        self.panel_rect = pygame.Rect(x, y, width, height)
+        self.field_rects = {
+            name: pygame.Rect(x + config.padding + config.label_width,
+                              y + config.padding + row * config.line_height,
+                              config.value_width, config.line_height)
+            for row, name in enumerate(FIELDS)}
+
+        # Static layer, rendered once and restored whenever a face box crosses the panel
+        self.panel = pygame.Surface(self.panel_rect.size, pygame.SRCALPHA)
+        self.panel.fill(config.panel_colour)
+        for row, label in enumerate(FIELDS.values()):
+            text = self.font.render(label, True, config.text_colour)
+            self.panel.blit(text, (config.padding, config.padding + row * config.line_height))
+        self.overlay.blit(self.panel, self.panel_rect)
+
+    def set(self, name: str, value):
+        """Store a field value, rendering happens in render()"""
+        self.values[name] = value
+
+    def set_faces(self, boxes: np.ndarray, frame_shape: Tuple[int, ...]):
+        """Face boxes as (x, y, w, h) rows in the coordinates of a frame of frame_shape"""
+        self.faces = (boxes, frame_shape[:2])
+
+    def update_telemetry(self, drone, controller):
+        """Read the values shown in the panel from the drone state and the controller"""
+        self.set('battery', drone.get_battery())
+        self.set('height', drone.get_height())
+        self.set('rc', controller.last_rc)
+        ttc = controller.obstacles.min_time_to_contact()
+        # Rounded so a value that barely moves doesn't re-render every tick
+        self.set('ttc', round(ttc, 1) if ttc is not None and math.isfinite(ttc) else None)
+        if controller.mission is not None:
+            mode = f"mission {controller.mission.state}"
+        elif controller.patrol_tracking_active:
+            mode = f"tracking {controller.target_name}" if controller.target_name else "tracking"
+        elif controller.patrol_mode_active:
+            mode = "patrol"
+        else:
+            mode = "manual" if controller.is_currently_flying else "landed"
+        self.set('mode', mode)
+
+    def _format(self, name: str, value) -> Tuple[str, Tuple[int, int, int]]:
+        colour = self.config.text_colour
+        if value is None:
+            return '--', colour
+        if name == 'battery':
+            if value < self.config.low_battery:
+                colour = self.config.warning_colour
+            return f"{value}%", colour
+        if name == 'height':
+            return f"{value} cm", colour
+        if name == 'rc':
+            return ' '.join(f"{v:4d}" for v in value), colour
+        if name == 'ttc':
+            if value < 3.0:
+                colour = self.config.warning_colour
+            return f"{value:.1f} s", colour
+        return str(value), colour
+
+    def _draw_field(self, name: str, value):
+        rect = self.field_rects[name]
+        text, colour = self._format(name, value)
+        self.overlay.fill(self.config.panel_colour, rect)
+        self.overlay.blit(self.font.render(text, True, colour), rect)
+
+    def _draw_faces(self, faces):
+        # Clear the previous boxes, restoring the panel if one of them crossed it
+        for rect in self.face_rects:
+            self.overlay.fill((0, 0, 0, 0), rect)
+        if self.panel_rect.collidelist(self.face_rects) != -1:
+            self.overlay.blit(self.panel, self.panel_rect)
+            self.shown = {}
+        self.face_rects = []
+        if faces is None:
+            return
+
+        boxes, (frame_h, frame_w) = faces
+        window_w, window_h = self.window_size
+        sx, sy = window_w / frame_w, window_h / frame_h
+        for x, y, w, h in boxes:
+            left = window_w - (x + w) * sx if self.config.mirror else x * sx
+            rect = pygame.Rect(int(left), int(y * sy), int(w * sx), int(h * sy))
+            pygame.draw.rect(self.overlay, self.config.face_colour, rect, 2)
+            pygame.draw.circle(self.overlay, self.config.face_colour, rect.center, 5)
+            self.face_rects.append(rect.inflate(2, 2))
+
+    def render(self) -> pygame.Surface:
+        """Bring the overlay up to date and return it for a single blit over the frame"""
+        faces = self.faces
+        if faces is not self.shown_faces:
+            self._draw_faces(faces)
+            self.shown_faces = faces
+        for name, value in list(self.values.items()):
+            if name in self.field_rects and (name not in self.shown or self.shown[name] != value):
+                self._draw_field(name, value)
+                self.shown[name] = value
+        return self.overlay
@@ -0,0 +1,194 @@
+import threading
+import time
+import logging
+import numpy as np
+import pygame
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+AXES = ('lr', 'fb', 'ud', 'yv')
+
+
+class InputBackend:
+    """
+    Source of pilot input for DroneController.
+
+    Digital backends answer get_key with the key names used in ControlConfig. Analogue
+    backends also return stick positions from get_axes, in the range -1..1 per axis,
+    which the controller uses directly instead of ramping speeds up from key presses.
+    """
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_key(self, key_name: str) -> bool:
+        return False
+
+    def get_axes(self) -> Optional[Dict[str, float]]:
+        return None
+
+
+class KeyboardBackend(InputBackend):
+    """Keys held in the pygame window"""
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def get_key(self, key_name: str) -> bool:
+        try:
+            key_input = pygame.key.get_pressed()
+            my_key = getattr(pygame, f'K_{key_name}')
+            return key_input[my_key]
+        except AttributeError:
+            self.logger.warning(f"Invalid key name: {key_name}")
+            return False
+
+
+@dataclass
+class JoystickConfig:
+    """Gamepad mapping, axis numbers follow the usual SDL layout for twin-stick pads"""
+    index: int = 0
+    # axis name -> (joystick axis, sign), sticks read negative when pushed up
+    axis_map: Dict[str, Tuple[int, int]] = field(default_factory=lambda: {
+        'lr': (0, 1),    # Left stick x
+        'fb': (1, -1),   # Left stick y
+        'yv': (2, 1),    # Right stick x
+        'ud': (3, -1),   # Right stick y
+    })
+    # ControlConfig key name -> joystick button
+    button_map: Dict[str, int] = field(default_factory=lambda: {
+        'e': 0,       # Take off
+        'q': 1,       # Land
+        'f': 2,       # Patrol
+        'g': 3,       # Stop patrol
+        'SPACE': 6,   # Emergency stop
+        'LSHIFT': 5,  # Speed modifier
+    })
+    dead_zone: float = 0.08
+    expo: float = 0.3  # 0 is linear, 1 is fully cubic
+    poll_rate: float = 100.0  # Hz
+
+
+def shape_axis(value: float, dead_zone: float, expo: float) -> float:
+    """Apply a rescaled dead zone then an expo curve to a raw -1..1 axis value"""
+    magnitude = abs(value)
+    if magnitude <= dead_zone:
+        return 0.0
+    scaled = min(1.0, (magnitude - dead_zone) / (1.0 - dead_zone))
+    curved = (1.0 - expo) * scaled + expo * scaled ** 3
+    return curved if value > 0 else -curved
+
+
+class JoystickBackend(InputBackend):
+    """
+    Gamepad input polled on its own fixed-rate thread. Sticks map straight onto
+    (lr, fb, ud, yv); buttons stand in for the keyboard's state keys.
+    pygame must be initialised first and its events pumped by the main loop.
+    """
+    def __init__(self, config: JoystickConfig = JoystickConfig()):
+        self.config = config
+        self.joystick = None
+        self.lock = threading.Lock()
+        self.axes = dict.fromkeys(AXES, 0.0)
+        self.buttons: Set[str] = set()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        pygame.joystick.init()
+        if pygame.joystick.get_count() <= self.config.index:
+            raise Exception(f"No joystick at index {self.config.index}")
+        self.joystick = pygame.joystick.Joystick(self.config.index)
+        self.joystick.init()
+        self.logger.info(f"Using joystick: {self.joystick.get_name()}")
+        self.running = True
+        self.thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def _poll_loop(self):
+        period = 1.0 / self.config.poll_rate
+        next_poll = time.monotonic()
+        while self.running:
+            axes = {}
+            for name, (axis, sign) in self.config.axis_map.items():
+                raw = self.joystick.get_axis(axis) * sign
+                axes[name] = shape_axis(raw, self.config.dead_zone, self.config.expo)
+            buttons = {key for key, button in self.config.button_map.items()
+                       if self.joystick.get_button(button)}
+            with self.lock:
+                self.axes = axes
+                self.buttons = buttons
+
+            next_poll += period
+            delay = next_poll - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.monotonic()
+
+    def get_key(self, key_name: str) -> bool:
+        with self.lock:
+            return key_name in self.buttons
+
+    def get_axes(self) -> Optional[Dict[str, float]]:
+        with self.lock:
+            return self.axes
+
+
+@dataclass
+class ScriptStep:
+    """Input held for duration seconds, axes None means a digital (keys only) step"""
+    duration: float
+    axes: Optional[Dict[str, float]] = None
+    keys: Set[str] = field(default_factory=set)
+
+
+class ScriptedBackend(InputBackend):
+    """
+    Plays back a fixed sequence of inputs, for benchmarks and tests. The clock can be
+    replaced so simulations run faster than real time.
+    """
+    def __init__(self, steps: List[ScriptStep], clock: Callable[[], float] = time.monotonic,
+                 loop: bool = False):
+        self.steps = steps
+        self.clock = clock
+        self.loop = loop
+        self.start_time: Optional[float] = None
+        self.total = sum(step.duration for step in steps)
+
+    def start(self):
+        self.start_time = self.clock()
+
+    def current_step(self) -> Optional[ScriptStep]:
+        if self.start_time is None:
+            self.start()
+        elapsed = self.clock() - self.start_time
+        if self.loop and self.total > 0:
+            elapsed %= self.total
+        for step in self.steps:
+            if elapsed < step.duration:
+                return step
+            elapsed -= step.duration
+        return None
+
+    @property
+    def finished(self) -> bool:
+        return not self.loop and self.current_step() is None
+
+    def get_key(self, key_name: str) -> bool:
+        step = self.current_step()
+        return step is not None and key_name in step.keys
+
+    def get_axes(self) -> Optional[Dict[str, float]]:
+        step = self.current_step()
+        if step is None or step.axes is None:
+            return None
+        return {axis: float(np.clip(step.axes.get(axis, 0.0), -1.0, 1.0)) for axis in AXES}
@@ -1,11 +1,18 @@
 from djitellopy import tello
-import pygame
+import contextlib
 import logging
 from dataclasses import dataclass, field
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import time
 import numpy as np
 import threading
+import tello_blackbox
+import tello_camera
+import tello_obstacle
+import tello_input
+import tello_mission
+import tello_odometry
+import tello_recognition
 import tello_video
 
 @dataclass
@@ -21,6 +28,10 @@ class DroneConfig:
     patrol_tracking_speed: int = 25
     max_speed: int = 100  # Maximum speed for movement
     acceleration_rate: int = 3  # Speed increase per update
+    follow_distance: float = 100.0  # cm kept from a tracked face
+    tracking_yaw_gain: float = 0.1  # Yaw rc per pixel the face is off centre, on a 1280 wide frame
+    tracking_distance_gain: float = 0.1  # Forward/back rc per cm off follow_distance
+    tracking_max_speed: int = 20  # Limit on both tracking rc values
 
 @dataclass
 class ControlConfig:
@@ -89,7 +100,8 @@ patrol_script = [
 class DroneController:
     """Handles keyboard-based drone control"""
     def __init__(self, drone_config: DroneConfig = DroneConfig(),
-                 control_config: ControlConfig = ControlConfig()):
+                 control_config: ControlConfig = ControlConfig(),
+                 video_manager: Optional[tello_video.VideoManager] = tello_video.video_manager):
         self.config = drone_config
         self.controls = control_config
         self.speeds = {'lr': 0, 'fb': 0, 'ud': 0, 'yv': 0}
@@ -101,11 +113,30 @@ class DroneController:
         self.patrol_tracking_active = False
         self.frames_since_last_detection = 0  # Counter for frames since last face detection
         self.max_frames_without_detection = 10  # Number of frames to continue tracking
+        self.last_face_info = None
+        self.detection_task_active = False  # True while a separate task (AsyncRuntime) detects faces
+        self.detected_face = None  # That task's latest find_target_face() result
+        self.camera = tello_camera.camera_model
+        self.face_frame_size = self.camera.image_size  # (width, height) of the frames faces were found in
+        self.target_name = None  # Person to follow when face recognition is enabled
+        self.recognizer = None
+        self.input_backend: tello_input.InputBackend = tello_input.KeyboardBackend()
+        self.mission: Optional[tello_mission.MissionRunner] = None
+        self.last_rc = (0, 0, 0, 0)  # Last rc values sent, shown by the HUD
+        self.watchdog = None  # tello_watchdog.Watchdog, takes the link over on stream or link loss
         self.patrol_commands = []
         self.current_command_index = 0
         self.current_command_start_time = 0
         for command in patrol_script:
             self.add_command(command.action, command.params, command.duration)
+        # Visual odometry runs on every frame and corrects drift while hovering
+        self.odometry = tello_odometry.VisualOdometry()
+        # Time-to-contact estimate used to cap forward speed near obstacles
+        self.obstacles = tello_obstacle.ObstacleDetector()
+        # Controllers without video (e.g. swarm members) skip both, their estimates stay neutral
+        if video_manager is not None:
+            video_manager.register_frame_processor(self.odometry.update)
+            video_manager.register_frame_processor(self.obstacles.update)
 
     @property
     def is_currently_flying(self) -> bool:
@@ -157,13 +188,7 @@ class DroneController:
 
     def get_key(self, key_name: str) -> bool:
         """Check if a specific key is pressed"""
-        try:
-            key_input = pygame.key.get_pressed()
-            my_key = getattr(pygame, f'K_{key_name}')
-            return key_input[my_key]
-        except AttributeError:
-            self.logger.warning(f"Invalid key name: {key_name}")
-            return False
+        return self.input_backend.get_key(key_name)
 
     def get_target_speed(self) -> int:
         """Calculate target speed based on modifier keys"""
@@ -189,10 +214,23 @@ class DroneController:
     def hover(self, drone: tello.Tello):
         """Hover in place without rotating."""
         try:
-            drone.send_rc_control(0, 0, 0, 0)  # Hover in place
+            drone.send_rc_control(*self.hold_position(drone))  # Hover in place
         except Exception as e:
             self.logger.error(f"Error during hover: {e}")
 
+    def hold_position(self, drone: tello.Tello) -> Tuple[int, int, int, int]:
+        """
+        Get rc values that hold the drone where it started hovering.
+
+        Returns:
+            tuple: (lr, fb, ud, yv) corrections from visual odometry, zero when not moving
+        """
+        yaw = drone.get_yaw()
+        if not self.odometry.holding:
+            self.odometry.start_hold(yaw)
+            return 0, 0, 0, 0
+        return self.odometry.correction(yaw)
+
     def patrol_mode(self, drone: tello.Tello):
         """Enter patrol mode, rotating and scanning for faces."""
         self.patrol_mode_active = True
@@ -210,43 +248,107 @@ class DroneController:
             self.logger.info("Face detected.")
             self.lock_on_face(drone, face_info)
 
-        self.logger.info("Patrol mode deactivated.")
+    def avoid_obstacles(self, rc: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        """Cap forward speed by the time to contact with whatever is ahead"""
+        lr, fb, ud, yv = rc
+        if fb > 0:
+            cap = self.obstacles.forward_speed_cap(self.config.max_speed)
+            if fb > cap:
+                self.logger.debug("Obstacle ahead, forward speed capped %d -> %d", fb, cap)
+                fb = cap
+        return lr, fb, ud, yv
 
     def process_face_tracking(self, drone: tello.Tello, face_info):
         """Process face tracking logic while maintaining a set distance."""
+        # Send control commands to rotate towards the face and maintain altitude
+        drone.send_rc_control(*self.face_tracking_rc(face_info))
+
+    def face_tracking_rc(self, face_info) -> Tuple[int, int, int, int]:
+        """rc values that turn towards a face and keep a set distance from it"""
         x, y, width, height = face_info[0]  # Get the coordinates and size of the face
-        frame_width = 1280  # Assuming your frame width is 1280
-        frame_height = 720  # Assuming your frame height is 720
+        camera = self.camera.for_size(*self.face_frame_size)
 
-        # Calculate error from center
-        error_x = x - (frame_width // 2)
-        speed_x = int(np.clip(error_x * 0.1, -20, 20))  # Adjust yaw based on x error
+        # Calculate error from center, in pixels of a 1280 wide frame whatever the frame size
+        limit = self.config.tracking_max_speed
+        error_x = camera.reference_pixels(x)
+        speed_x = int(np.clip(error_x * self.config.tracking_yaw_gain, -limit, limit))  # Adjust yaw based on x error
 
-        # Set desired distance and calculate current distance based on face size
-        desired_distance = 100  # Set your desired distance in cm
-        current_distance = (desired_distance * frame_height) / height  # Estimate distance based on face height
-        distance_error = current_distance - desired_distance
-        speed_y = int(np.clip(distance_error * 0.1, -20, 20))  # Adjust altitude based on distance error
+        # Keep the set distance, estimated from the face width and the focal length
+        distance_error = camera.face_distance(width) - self.config.follow_distance
+        speed_y = int(np.clip(distance_error * self.config.tracking_distance_gain, -limit, limit))  # Adjust forward/back based on distance error
 
-        # Send control commands to rotate towards the face and maintain altitude
-        drone.send_rc_control(0, speed_y, 0, speed_x)  # Adjust up/down and yaw based on errors
+        return 0, speed_y, 0, speed_x  # Adjust forward/back and yaw based on errors
+
+    def start_mission(self, mission):
+        """
+        Fly a mission once airborne, replacing patrol mode.
+
+        Args:
+            mission: tello_mission.Mission or path to a JSON/YAML mission file
+        """
+        if not isinstance(mission, tello_mission.Mission):
+            mission = tello_mission.load_mission(mission)
+        self.mission = tello_mission.MissionRunner(mission)
+        self.patrol_mode_active = False
+        self.logger.info(f"Mission '{mission.name}' loaded, it starts once flying")
+
+    def stop_mission(self, reason: str = 'stopped'):
+        if self.mission is not None:
+            self.mission.stop(reason)
+            self.mission = None
+
+    def follow_person(self, name: Optional[str]):
+        """Only track the face recognised as name, or any face again if name is None"""
+        if name is not None and self.recognizer is None:
+            self.recognizer = tello_recognition.FaceRecognizer()
+        self.target_name = name
+        self.last_face_info = None
+        self.logger.info(f"Following {name}" if name else "Following any face")
+
+    def find_target_face(self, frame):
+        """
+        Find the face to track in a frame.
+
+        Returns:
+            list: [(center_x, center_y, width, height)] or None if the target isn't visible
+        """
+        # Boxes and the recognizer's crops both come from the frame the boxes were found in,
+        # undistorted if enabled and a little older when detection runs in the frame bus process
+        frame, boxes = tello_video.video_manager.faces_in(frame)
+        self.face_frame_size = (frame.shape[1], frame.shape[0])
+        if self.target_name is not None:
+            self.recognizer.update(frame, boxes)
+            track = self.recognizer.find(self.target_name)
+            if track is None:
+                return None
+            x, y, w, h = track.box
+        elif len(boxes):
+            x, y, w, h = boxes[np.argmax(boxes[:, 2] * boxes[:, 3])]
+        else:
+            return None
+        return [(x + w // 2, y + h // 2, w, h)]
+
+    def current_face(self, drone: tello.Tello):
+        """The target face in the newest frame, from the detection task when one is running"""
+        if self.detection_task_active:
+            return self.detected_face
+        return self.find_target_face(drone.get_frame_read().frame)
 
     def track(self, drone: tello.Tello):
         """Rotate to face the detected face."""
         try:
             # Check for face detection
-            frame = drone.get_frame_read().frame
-            frame, face_info = self.face_detector.find_face(frame)
-            if face_info[1] != 0:  # If a face is detected
-                last_face_info = face_info
+            face_info = self.current_face(drone)
+            if face_info is not None:  # If a face is detected
+                self.last_face_info = face_info
                 self.frames_since_last_detection = 0
                 self.process_face_tracking(drone, face_info)  # Call the new method
             else:
                 self.frames_since_last_detection += 1
-                if self.frames_since_last_detection <= self.max_frames_without_detection and last_face_info is not None:
-                    self.process_face_tracking(drone, last_face_info)  # Continue tracking the last known face
+                if self.frames_since_last_detection <= self.max_frames_without_detection and self.last_face_info is not None:
+                    self.process_face_tracking(drone, self.last_face_info)  # Continue tracking the last known face
                 else:
-                    self.logger.info("No face detected.")
+                    self.logger.debug("No face detected.")
                     drone.send_rc_control(0, 0, 0, 0)  # Stop rotating if no face is detected
 
         except Exception as e:
@@ -264,10 +366,8 @@ class DroneController:
         Returns:
             bool: True if any input was processed
         """
+        tick_start = time.perf_counter()
         try:
-            # Add debug logging
-            self.logger.debug("Starting update_controls")
-            
             # Check if is_flying is callable
             if not hasattr(drone, 'is_flying'):
                 self.logger.error("Drone object has no is_flying method")
@@ -280,15 +380,21 @@ class DroneController:
                     flying_status = drone.is_flying()
                 else:
                     flying_status = drone.is_flying
-                self.logger.debug(f"Current flying status: {flying_status}")
                 self.is_currently_flying = bool(flying_status)  # Ensure boolean conversion
             except Exception as e:
                 self.logger.error(f"Error checking flight status: {e}")
                 return False
 
+            # The watchdog's failsafe owns the link until every source is healthy again. The tick
+            # still runs so the watchdog sees whether the loop is healthy, but sends nothing
+            failsafe = self.watchdog is not None and self.watchdog.engaged
+
             # Check for takeoff
-            if self.get_key(self.controls.state_controls['takeoff']) and not self.is_currently_flying:
-                if not self.safe_takeoff(drone):
+            if self.get_key(self.controls.state_controls['takeoff']) and not self.is_currently_flying \
+                    and not failsafe:
+                with self.blocking('takeoff'):
+                    took_off = self.safe_takeoff(drone)
+                if not took_off:
                     self.logger.error("Failed to take off after multiple attempts.")
                     return False
 
@@ -302,69 +408,119 @@ class DroneController:
             # Check for patrol mode deactivation
             if self.get_key(self.controls.state_controls['stop_patrol']) and self.patrol_mode_active:
                 self.patrol_mode_active = False
+            if self.get_key(self.controls.state_controls['stop_patrol']) and self.mission is not None:
+                self.stop_mission('stopped by pilot')
                 #self.hover(drone)  # Optionally hover after exiting patrol mode
 
             # Check for flip
-            if self.get_key(self.controls.state_controls['flip_left']) and self.is_currently_flying:
-                drone.flip_left()
-            elif self.get_key(self.controls.state_controls['flip_right']) and self.is_currently_flying:
-                drone.flip_right()
-            elif self.get_key(self.controls.state_controls['flip_forward']) and self.is_currently_flying:
-                drone.flip_forward()
-            elif self.get_key(self.controls.state_controls['flip_back']) and self.is_currently_flying:
-                drone.flip_back()
+            if self.is_currently_flying and not failsafe:
+                for flip in ('flip_left', 'flip_right', 'flip_forward', 'flip_back'):
+                    if self.get_key(self.controls.state_controls[flip]):
+                        with self.blocking('flip'):
+                            getattr(drone, flip)()
+                        break
 
             # Process movement controls
-            for direction, keys in self.controls.movement_controls.items():
-                if self.get_key(keys['pos']):
-                    # Increase speed gradually
-                    if self.current_speeds[direction] < self.config.max_speed:
-                        self.current_speeds[direction] += self.config.acceleration_rate
-                        self.current_speeds[direction] = min(self.current_speeds[direction], self.config.max_speed)
-                    self.speeds[direction] = self.current_speeds[direction]
-                elif self.get_key(keys['neg']):
-                    # Decrease speed gradually
-                    if self.current_speeds[direction] > -self.config.max_speed:
-                        self.current_speeds[direction] -= self.config.acceleration_rate
-                        self.current_speeds[direction] = max(self.current_speeds[direction], -self.config.max_speed)
-                    self.speeds[direction] = self.current_speeds[direction]
-                else:
-                    # Apply countersteer if no key is pressed
-                    self.speeds[direction] = self.apply_countersteer(
-                        self.speeds[direction], direction
-                    )
-                    # Gradually decrease speed when key is released
-                    if self.current_speeds[direction] > 0:
-                        self.current_speeds[direction] = max(0, self.current_speeds[direction] - self.config.speed_falloff)
-                    elif self.current_speeds[direction] < 0:
-                        self.current_speeds[direction] = min(0, self.current_speeds[direction] + self.config.speed_falloff)
+            axes = self.input_backend.get_axes()
+            if axes is not None:
+                # Analogue sticks set the speed directly, no ramping
+                target_speed = min(self.get_target_speed(), self.config.max_speed)
+                for direction in self.speeds:
+                    self.speeds[direction] = int(axes[direction] * target_speed)
+                    self.current_speeds[direction] = self.speeds[direction]
+            else:
+                for direction, keys in self.controls.movement_controls.items():
+                    if self.get_key(keys['pos']):
+                        # Increase speed gradually
+                        if self.current_speeds[direction] < self.config.max_speed:
+                            self.current_speeds[direction] += self.config.acceleration_rate
+                            self.current_speeds[direction] = min(self.current_speeds[direction], self.config.max_speed)
+                        self.speeds[direction] = self.current_speeds[direction]
+                    elif self.get_key(keys['neg']):
+                        # Decrease speed gradually
+                        if self.current_speeds[direction] > -self.config.max_speed:
+                            self.current_speeds[direction] -= self.config.acceleration_rate
+                            self.current_speeds[direction] = max(self.current_speeds[direction], -self.config.max_speed)
+                        self.speeds[direction] = self.current_speeds[direction]
+                    else:
+                        # Apply countersteer if no key is pressed
+                        self.speeds[direction] = self.apply_countersteer(
+                            self.speeds[direction], direction
+                        )
+                        # Gradually decrease speed when key is released
+                        if self.current_speeds[direction] > 0:
+                            self.current_speeds[direction] = max(0, self.current_speeds[direction] - self.config.speed_falloff)
+                        elif self.current_speeds[direction] < 0:
+                            self.current_speeds[direction] = min(0, self.current_speeds[direction] + self.config.speed_falloff)
 
             # Emergency stop
             if self.get_key("SPACE"):
                 self.speeds = dict.fromkeys(self.speeds, 0)
                 self.current_speeds = dict.fromkeys(self.current_speeds, 0)
+                self.stop_mission('emergency stop')
+                tello_blackbox.dump('emergency stop', background=True)
+
+            # Mission steps plus its geofence and battery rules, only the pilot's own input overrides it
+            mission_rc = None
+            if self.mission is not None and self.is_currently_flying and not failsafe:
+                mission_rc = self.mission.tick(self, drone)
+                if self.mission.land_requested:
+                    self.mission = None
+                    with self.blocking('land'):
+                        drone.land()
+                    self.is_currently_flying = False
+                    self.heartbeat()
+                    return True
+                if self.mission.finished:
+                    self.mission = None
 
             # Start tracking mode
-            if self.patrol_tracking_active:
+            if failsafe:
+                pass
+            elif self.patrol_tracking_active:
                 self.track(drone)
             elif self.patrol_mode_active:
                 self.execute_patrol_script(drone)
                 #self.patrol(drone)
 
-            # Send control commands to drone
-            drone.send_rc_control(
-                self.speeds['lr'], 
-                self.speeds['fb'], 
-                self.speeds['ud'], 
-                self.speeds['yv']
-            )
+            # Hold position while hovering with no input, otherwise fly on the stick values
+            autonomous = self.patrol_mode_active or self.patrol_tracking_active
+            rc = (self.speeds['lr'], self.speeds['fb'], self.speeds['ud'], self.speeds['yv'])
+            if mission_rc is not None and not any(rc):
+                rc = mission_rc
+            if self.is_currently_flying and not any(rc) and not autonomous:
+                rc = self.hold_position(drone)
+            else:
+                self.odometry.stop_hold()
+
+            rc = self.avoid_obstacles(rc)
 
+            # Tracking and the patrol script sent their own rc above, only the pilot's input overrides it
+            if not failsafe and (any(rc) or not autonomous):
+                drone.send_rc_control(*rc)
+                self.last_rc = rc
+                tello_blackbox.record('tick', 'rc %d %d %d %d in %.2fms', *rc,
+                                      1000 * (time.perf_counter() - tick_start))
+
+            self.heartbeat()
             return True  # Indicate that controls were updated
 
         except Exception as e:
             self.logger.error(f"Error updating controls: {e}", exc_info=True)
+            tello_blackbox.dump('control exception', background=True)
             return False
 
+    def heartbeat(self):
+        """Tell the watchdog a full control tick went through"""
+        if self.watchdog is not None:
+            self.watchdog.heartbeat()
+
+    def blocking(self, command: str):
+        """Context for SDK calls that hold the control loop up, so the watchdog doesn't take them for a stall"""
+        if self.watchdog is None:
+            return contextlib.nullcontext()
+        return self.watchdog.blocking(command)
+
     def safe_takeoff(self, drone: tello.Tello) -> bool:
         """Safely take off the drone with retries."""
         max_retries = 3
@@ -1,8 +1,23 @@
+import argparse
+import logging
+import time
 import network_config
+import tello_blackbox
+import tello_hud
 import tello_keyboard
 import tello_pygame
+import tello_watchdog
 import tello_video
 
+def start_watchdog(drone):
+    """Watch frames, state packets and control ticks, with a failsafe if any of them stop"""
+    watchdog = tello_watchdog.Watchdog(drone, tello_keyboard.drone_controller)
+    tello_keyboard.drone_controller.watchdog = watchdog
+    tello_video.video_manager.register_frame_processor(watchdog.frame_received)
+    watchdog.start()
+    return watchdog
+
+
 def run_tello():
 
     # open connection to tello drone
@@ -10,10 +25,15 @@ def run_tello():
     
     # initialise videomanager
     video_manager = tello_video.VideoManager
+    watchdog = start_watchdog(drone)
 
 
     # initialise pygame
     tello_pygame.initialise_pygame()
+    hud = tello_hud.Hud(tello_pygame.get_dimensions())
+    tello_video.video_manager.attach_hud(hud)
+    input_backend = tello_keyboard.drone_controller.input_backend
+    input_backend.start()
     # switch focus to pygame window
 
     # main loop
@@ -25,8 +45,8 @@ def run_tello():
         tello_video.drone_update_stream(drone)  
         
         # update keyboard - movement based on this
-        if not tello_keyboard.update_controls(drone):
-            pass
+        tello_keyboard.update_controls(drone)
+        hud.update_telemetry(drone, tello_keyboard.drone_controller)
 
 
         # detect faces
@@ -34,29 +54,110 @@ def run_tello():
         
         # recognise faces
         
-        # detect surroundings
-        # avoid surroundings
+        # detect surroundings / avoid surroundings - forward speed is capped by
+        # the obstacle time-to-contact estimate inside update_controls
 
         # end main loop
 
+    if tello_video.video_manager.motion_gate is not None:
+        logging.info(f"Motion gate: {tello_video.video_manager.motion_gate.stats()}")
+
+    watchdog.stop()
+
     # close pygame
+    input_backend.stop()
     tello_pygame.quit_pygame()
 
 
 # this function returns the name of the current wifi network
 
+def run_tello_headless(host: str = '127.0.0.1'):
+    # imported here, only the headless mode needs the network server
+    import tello_remote
+
+    drone = tello_keyboard.initialise_drone()
+
+    # no pygame window - keys and video go over the network instead
+    server = tello_remote.RemoteControlServer(tello_remote.RemoteConfig(host=host))
+    server.start()
+    tello_video.video_manager.display_enabled = False
+    tello_video.video_manager.register_frame_processor(server.publish_frame)
+    tello_keyboard.drone_controller.input_backend = server
+    watchdog = start_watchdog(drone)
+
+    try:
+        while server.running:
+            tello_video.drone_update_stream(drone)
+            tello_keyboard.update_controls(drone)
+            if server.pop_snapshot_request():
+                tello_video.take_a_snapshot()
+            time.sleep(1 / tello_video.video_manager.config.fps_limit)
+    finally:
+        watchdog.stop()
+        server.stop()
+        drone.send_rc_control(0, 0, 0, 0)
+        if tello_keyboard.drone_controller.is_currently_flying:
+            drone.land()
+        drone.streamoff()
+
+
+def run_tello_async():
+    # imported here so the blocking mode doesn't pay for the asyncio runtime
+    import tello_async
+    tello_async.run_tello_async()
+
+
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description="Control a Tello drone")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="run the asyncio runtime instead of the blocking main loop")
+    parser.add_argument('--headless', action='store_true',
+                        help="no window, take control and stream video over the network")
+    parser.add_argument('--listen', default='127.0.0.1',
+                        help="address the headless server listens on, others need TELLO_REMOTE_TOKEN set")
+    parser.add_argument('--joystick', action='store_true',
+                        help="fly with a gamepad instead of the keyboard")
+    parser.add_argument('--mission', help="JSON or YAML mission to fly after takeoff")
+    parser.add_argument('--profile', help="gains tuned by tello_tuning.py")
+    parser.add_argument('--frame-bus', action='store_true',
+                        help="share frames over shared memory and run face detection in another process")
+    args = parser.parse_args()
+
+    # recent events, commands and timings are written to Logs/BlackBox on a crash or exit
+    tello_blackbox.install()
+
+    if args.profile:
+        # imported here, only needed when flying with tuned gains
+        import tello_tuning
+        tello_keyboard.drone_controller.config = tello_tuning.load_profile(args.profile)
+
+    if args.mission:
+        tello_keyboard.drone_controller.start_mission(args.mission)
+
+    if args.joystick:
+        import tello_input
+        tello_keyboard.drone_controller.input_backend = tello_input.JoystickBackend()
+
+    frame_bus = None
+    if args.frame_bus:
+        # imported here, only needed when detection runs in a consumer process
+        import tello_framebus
+        frame_bus = tello_framebus.FrameBus()
+        tello_video.video_manager.attach_frame_bus(frame_bus)
+
     print(network_config.get_current_wifi_network())
 
     network_config.configure_network_for_tello()
 
-    run_tello()
-
-    network_config.restore_network_configuration()
-
-    
-    
-    
-    
-    
+    try:
+        if args.headless:
+            run_tello_headless(args.listen)
+        elif args.use_async:
+            run_tello_async()
+        else:
+            run_tello()
+    finally:
+        if frame_bus is not None:
+            frame_bus.close()
+        network_config.restore_network_configuration()
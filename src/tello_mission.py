@@ -0,0 +1,342 @@
+import json
+import math
+import time
+import argparse
+import logging
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import yaml
+except ImportError:  # JSON missions work without PyYAML
+    yaml = None
+
+STEP_KINDS = ('move', 'hover', 'search', 'snapshot', 'land')
+ACTIONS = ('hover', 'return', 'land')
+AXES = ('lr', 'fb', 'ud', 'yv')
+
+
+@dataclass
+class GeofenceConfig:
+    """Soft limits around the take-off point, enforced from integrated velocity and height telemetry"""
+    radius: float = 500.0  # cm horizontally from home
+    max_height: float = 250.0  # cm
+    margin: float = 100.0  # cm inside the radius to fly back to after a breach
+    action: str = 'return'  # On a breach: hover, return (fly back inside and carry on) or land
+
+
+@dataclass
+class BatteryConfig:
+    """Battery levels at which the mission is abandoned"""
+    return_level: int = 30  # % at which the drone flies home and lands
+    land_level: int = 15  # % at which it lands wherever it is
+
+
+@dataclass
+class MissionStep:
+    """
+    One step of a mission. move flies rc for duration, hover holds position, search yaws
+    at rc until a face (or the target person) is found then tracks it for track_duration,
+    snapshot saves the next frame and land ends the mission.
+    """
+    kind: str
+    duration: float = 0.0
+    rc: Tuple[int, int, int, int] = (0, 0, 0, 0)
+    target: Optional[str] = None
+    track_duration: float = 5.0
+
+
+@dataclass
+class Mission:
+    """A sequence of steps plus the rules that stay in force while flying it"""
+    steps: List[MissionStep]
+    name: str = 'mission'
+    repeat: int = 1  # 0 repeats until stopped
+    on_complete: str = 'return'  # hover, return (fly home and land) or land
+    geofence: GeofenceConfig = field(default_factory=GeofenceConfig)
+    battery: BatteryConfig = field(default_factory=BatteryConfig)
+    velocity_scale: float = 10.0  # cm/s per unit of the vgx/vgy state fields (dm/s)
+    return_speed: int = 30  # rc speed when flying home or back inside the fence
+    return_gain: float = 0.5  # rc per cm of distance, slows the approach near the target
+    home_radius: float = 30.0  # cm from home that counts as arrived
+
+
+def _check_action(action: str, what: str):
+    if action not in ACTIONS:
+        raise ValueError(f"{what} must be one of {', '.join(ACTIONS)}, not '{action}'")
+
+
+def parse_step(data: dict) -> MissionStep:
+    kind = data.get('type')
+    if kind not in STEP_KINDS:
+        raise ValueError(f"Unknown mission step type '{kind}', expected one of {', '.join(STEP_KINDS)}")
+    rc = tuple(int(data.get(axis, 0)) for axis in AXES)
+    if kind == 'search' and not any(rc):
+        rc = (0, 0, 0, 25)  # Same rate as patrol_rotation_speed
+    return MissionStep(kind, float(data.get('duration', 0.0)), rc, data.get('target'),
+                       float(data.get('track_duration', MissionStep.track_duration)))
+
+
+def parse_mission(data: dict) -> Mission:
+    """Build a Mission from the dict form used in mission files"""
+    steps = [parse_step(step) for step in data.get('steps', [])]
+    if not steps:
+        raise ValueError("Mission has no steps")
+    mission = Mission(steps, **{key: data[key] for key in
+                                ('name', 'repeat', 'on_complete', 'velocity_scale', 'return_speed',
+                                 'return_gain', 'home_radius') if key in data})
+    mission.geofence = GeofenceConfig(**data.get('geofence', {}))
+    mission.battery = BatteryConfig(**data.get('battery', {}))
+    _check_action(mission.on_complete, "on_complete")
+    _check_action(mission.geofence.action, "geofence action")
+    return mission
+
+
+def load_mission(path) -> Mission:
+    """Load a mission from a .json or .yaml/.yml file"""
+    path = Path(path)
+    with open(path, encoding='utf-8') as f:
+        if path.suffix.lower() in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ImportError("PyYAML is needed for YAML missions, install it or use JSON")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return parse_mission(data)
+
+
+class MissionRunner:
+    """
+    Flies a Mission from DroneController.update_controls, one tick per control update.
+
+    Position is dead-reckoned from the body-frame vgx/vgy state fields rotated by yaw,
+    with home at the point where the mission started. Each tick does a constant amount
+    of work: one integration step, a few comparisons for the geofence and battery rules
+    and the current step's rc, so the rules cost nothing noticeable in the control loop.
+    """
+    def __init__(self, mission: Mission, clock: Callable[[], float] = time.monotonic):
+        self.mission = mission
+        self.clock = clock
+        self.state = 'waiting'  # waiting, mission, returning, holding, done
+        self.resume_after_return = False
+        self.land_requested = False
+        self.reason = ''
+        self.x = 0.0  # cm along yaw 0
+        self.y = 0.0  # cm to the right of yaw 0
+        self.height = 0.0
+        self.last_tick: Optional[float] = None
+        self.step_index = 0
+        self.step_start = 0.0
+        self.loops_done = 0
+        self.face_found_at: Optional[float] = None
+        self.paused_at: Optional[float] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def finished(self) -> bool:
+        return self.state == 'done'
+
+    @property
+    def distance_from_home(self) -> float:
+        return math.hypot(self.x, self.y)
+
+    @property
+    def current_step(self) -> Optional[MissionStep]:
+        return self.mission.steps[self.step_index] if self.state == 'mission' else None
+
+    def start(self, now: float):
+        self.state = 'mission'
+        self.x = self.y = 0.0
+        self.last_tick = now
+        self._begin_step(0, now)
+        self.logger.info(f"Mission '{self.mission.name}' started")
+
+    def stop(self, reason: str = 'stopped'):
+        if self.state != 'done':
+            self.logger.info(f"Mission '{self.mission.name}' ended: {reason}")
+        self.state = 'done'
+        self.reason = reason
+
+    def _begin_step(self, index: int, now: float):
+        self.step_index = index
+        self.step_start = now
+        self.face_found_at = None
+
+    def _advance(self, now: float):
+        index = self.step_index + 1
+        if index >= len(self.mission.steps):
+            self.loops_done += 1
+            if self.mission.repeat and self.loops_done >= self.mission.repeat:
+                self._take_action(self.mission.on_complete, 'mission complete')
+                return
+            index = 0
+        self._begin_step(index, now)
+
+    def _take_action(self, action: str, reason: str, resume: bool = False):
+        self.logger.warning(f"Mission '{self.mission.name}': {reason}, {action}")
+        self.reason = reason
+        if action == 'land':
+            self.land_requested = True
+            self.state = 'done'
+        elif action == 'return':
+            self.state = 'returning'
+            self.resume_after_return = resume
+        elif resume:
+            self.state = 'holding'
+        else:
+            self.state = 'done'
+        if resume and self.paused_at is None:
+            self.paused_at = self.clock()
+
+    def _integrate(self, drone, now: float):
+        # Clamp dt so a stalled loop doesn't turn one velocity sample into a jump
+        dt = min(now - self.last_tick, 0.5)
+        self.last_tick = now
+        scale = self.mission.velocity_scale
+        forward = drone.get_speed_x() * scale
+        right = drone.get_speed_y() * scale
+        yaw = math.radians(drone.get_yaw())
+        cos_yaw, sin_yaw = math.cos(yaw), math.sin(yaw)
+        self.x += (forward * cos_yaw - right * sin_yaw) * dt
+        self.y += (forward * sin_yaw + right * cos_yaw) * dt
+        self.height = drone.get_height()
+        return cos_yaw, sin_yaw
+
+    def _check_rules(self, drone):
+        if self.land_requested:
+            return
+        battery = self.mission.battery
+        level = drone.get_battery()
+        if level <= battery.land_level:
+            self._take_action('land', f"battery at {level}%")
+            return
+        if level <= battery.return_level and not (self.state == 'returning' and not self.resume_after_return):
+            self._take_action('return', f"battery at {level}%")
+            return
+
+        fence = self.mission.geofence
+        if self.state == 'mission' and self.distance_from_home > fence.radius:
+            self._take_action(fence.action, f"outside the {fence.radius:.0f}cm geofence", resume=True)
+        elif self.state == 'holding' and self.distance_from_home < fence.radius - fence.margin:
+            self._resume()
+
+    def _resume(self):
+        # Steps pick up where they were, without the time spent outside the fence
+        if self.paused_at is not None:
+            self.step_start += self.clock() - self.paused_at
+            self.paused_at = None
+        self.state = 'mission'
+        self.logger.info(f"Mission '{self.mission.name}' resumed")
+
+    def _return_rc(self, cos_yaw: float, sin_yaw: float) -> Tuple[int, int, int, int]:
+        distance = self.distance_from_home
+        if self.resume_after_return:
+            fence = self.mission.geofence
+            if distance < fence.radius - fence.margin:
+                self._resume()
+                return 0, 0, 0, 0
+        elif distance < self.mission.home_radius:
+            self._take_action('land', 'home')
+            return 0, 0, 0, 0
+
+        # Head straight for home, slowing down on the approach
+        speed = min(self.mission.return_speed, self.mission.return_gain * distance)
+        ex, ey = -self.x / distance * speed, -self.y / distance * speed
+        fb = ex * cos_yaw + ey * sin_yaw
+        lr = -ex * sin_yaw + ey * cos_yaw
+        return int(round(lr)), int(round(fb)), 0, 0
+
+    def _step_rc(self, controller, drone, now: float) -> Optional[Tuple[int, int, int, int]]:
+        step = self.mission.steps[self.step_index]
+        elapsed = now - self.step_start
+
+        if step.kind == 'snapshot':
+            # imported here so checking a mission file doesn't start the video manager
+            import tello_video
+            tello_video.take_a_snapshot()
+            self._advance(now)
+            return 0, 0, 0, 0
+        if step.kind == 'land':
+            self._take_action('land', 'land step')
+            return 0, 0, 0, 0
+        if step.kind == 'search':
+            return self._search_rc(step, controller, drone, now)
+
+        if elapsed >= step.duration:
+            self._advance(now)
+            return 0, 0, 0, 0
+        return step.rc if step.kind == 'move' else (0, 0, 0, 0)
+
+    def _search_rc(self, step: MissionStep, controller, drone, now: float) -> Tuple[int, int, int, int]:
+        if step.target is not None and controller.target_name != step.target:
+            controller.follow_person(step.target)
+
+        face_info = controller.current_face(drone)
+        if face_info is not None:
+            controller.last_face_info = face_info
+            controller.frames_since_last_detection = 0
+            if self.face_found_at is None:
+                self.face_found_at = now
+                self.logger.info(f"Mission '{self.mission.name}': face found")
+        elif controller.last_face_info is not None:
+            controller.frames_since_last_detection += 1
+
+        if self.face_found_at is not None:
+            if now - self.face_found_at >= step.track_duration:
+                self._advance(now)
+                return 0, 0, 0, 0
+            if controller.frames_since_last_detection <= controller.max_frames_without_detection:
+                return controller.face_tracking_rc(controller.last_face_info)
+            return 0, 0, 0, 0
+
+        if now - self.step_start >= step.duration:
+            self._advance(now)
+            return 0, 0, 0, 0
+        return step.rc
+
+    def tick(self, controller, drone) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Advance the mission by one control update.
+
+        Returns:
+            tuple: (lr, fb, ud, yv) to fly, or None once the mission has finished.
+            Check land_requested afterwards, the controller does the landing.
+        """
+        now = self.clock()
+        if self.state == 'done':
+            return None
+        if self.state == 'waiting':
+            self.start(now)
+
+        cos_yaw, sin_yaw = self._integrate(drone, now)
+        self._check_rules(drone)
+
+        if self.state == 'mission':
+            rc = self._step_rc(controller, drone, now)
+        elif self.state == 'returning':
+            rc = self._return_rc(cos_yaw, sin_yaw)
+        elif self.state == 'holding':
+            rc = (0, 0, 0, 0)
+        else:
+            return None
+
+        # The height limit applies on top of whatever else is flying
+        if self.height > self.mission.geofence.max_height and rc[2] >= 0:
+            rc = (rc[0], rc[1], -self.mission.return_speed, rc[3])
+        return rc
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check a mission file")
+    parser.add_argument('mission', type=Path, help="mission in JSON or YAML")
+    args = parser.parse_args()
+
+    mission = load_mission(args.mission)
+    print(f"{mission.name}: {len(mission.steps)} steps, repeat {mission.repeat or 'forever'}, "
+          f"then {mission.on_complete}")
+    for index, step in enumerate(mission.steps):
+        print(f"  {index}: {step.kind} {step.duration:.1f}s rc={step.rc}" +
+              (f" target={step.target}" if step.target else ""))
+    print(f"  geofence {mission.geofence}")
+    print(f"  battery {mission.battery}")
@@ -0,0 +1,90 @@
+import numpy as np
+import cv2
+import time
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class MotionGateConfig:
+    """Configuration for skipping face detection on frames that haven't changed"""
+    pyramid_level: int = 3  # Gray pyramid level compared, 3 is an eighth of full size
+    threshold: float = 3.0  # Mean absolute grey-level difference that counts as a change
+    max_reuse_frames: int = 10  # Detect again after reusing the result for this many frames regardless
+    max_reuse_age: float = 0.5  # Seconds, likewise
+
+
+class MotionGate:
+    """
+    Decides whether a frame needs face detection or the previous result still holds.
+
+    Each frame's thumbnail (a level of the shared gray pyramid, so usually already
+    computed) is compared with the thumbnail of the frame detection last ran on, not with
+    the previous frame, so slow drift during a patrol rotation still adds up to a change.
+    Decisions and stats are per frame: looking the same frame up again (by its cache seq)
+    returns the same result without counting it again.
+    """
+    def __init__(self, config: MotionGateConfig = MotionGateConfig()):
+        self.config = config
+        self.lock = threading.Lock()
+        self.reference: Optional[np.ndarray] = None
+        self.diff: Optional[np.ndarray] = None
+        self.result = None
+        self.reuse_count = 0  # Frames the result was reused for
+        self.reference_time = 0.0
+        self.reference_seq = -1  # Frame the result was detected on
+        self.reused_seq = -1  # Newest frame the result was reused for
+        self.hits = 0  # Frames whose detection was skipped, previous result reused
+        self.misses = 0  # Frames detection ran on
+
+    def cached(self, derived):
+        """
+        The previous detection result if it still applies to this frame, otherwise None
+        and detection should run and be passed to store().
+        """
+        with self.lock:
+            if self.result is not None and derived.seq >= 0 and \
+                    derived.seq in (self.reference_seq, self.reused_seq):
+                return self.result  # Same frame again, already decided and counted
+        thumbnail = derived.pyramid(self.config.pyramid_level)
+        with self.lock:
+            if self.result is not None and self.reference.shape == thumbnail.shape and \
+                    self.reuse_count < self.config.max_reuse_frames and \
+                    time.monotonic() - self.reference_time < self.config.max_reuse_age:
+                cv2.absdiff(thumbnail, self.reference, dst=self.diff)
+                if cv2.mean(self.diff)[0] < self.config.threshold:
+                    self.reuse_count += 1
+                    self.hits += 1
+                    self.reused_seq = derived.seq
+                    return self.result
+            self.misses += 1
+            return None
+
+    def store(self, derived, result):
+        """Remember a fresh detection result and the frame it came from"""
+        thumbnail = derived.pyramid(self.config.pyramid_level)
+        with self.lock:
+            if self.reference is None or self.reference.shape != thumbnail.shape:
+                self.reference = np.empty_like(thumbnail)
+                self.diff = np.empty_like(thumbnail)
+            np.copyto(self.reference, thumbnail)
+            self.result = result
+            self.reuse_count = 0
+            self.reference_time = time.monotonic()
+            self.reference_seq = derived.seq
+            self.reused_seq = -1
+
+    def reset(self):
+        with self.lock:
+            self.result = None
+            self.reference_seq = -1
+            self.reused_seq = -1
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'reused': self.hits,
+            'detected': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,130 @@
+import numpy as np
+import cv2
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass
+class ObstacleConfig:
+    """Configuration for time-to-contact obstacle estimation"""
+    pyramid_level: int = 3  # Gray pyramid level to compute flow on, 3 is an eighth of full size
+    grid: Tuple[int, int] = (3, 4)  # Rows, columns of the time-to-contact grid
+    central_fraction: float = 0.6  # Only cells whose centre lies in this part of the frame count
+    min_radius: float = 4.0  # Pixels (decimated) around the centre ignored, expansion is ill-defined there
+    ttc_stop: float = 1.0  # Seconds to contact at which forward speed is capped to zero
+    ttc_slow: float = 3.0  # Seconds to contact below which forward speed is reduced
+    smoothing: float = 0.4  # Weight of the newest expansion estimate
+    max_frame_age: float = 0.5  # Seconds before the estimate is considered stale
+
+
+class ObstacleDetector:
+    """
+    Estimates time to contact on a coarse grid from the expansion of dense optical flow.
+
+    An approaching surface expands away from the focus of expansion; the radial flow per
+    unit radius is the rate of change of its apparent size, and time to contact is its
+    inverse. The focus is taken as the image centre and the mean flow is removed first so
+    yaw and sideways motion don't read as expansion.
+    """
+    def __init__(self, config: ObstacleConfig = ObstacleConfig()):
+        self.config = config
+        self.lock = threading.Lock()
+        self.source_shape = None
+        self.gray = None
+        self.prev_gray = None
+        self.flow = None
+        self.has_previous = False
+        self.last_update = 0.0  # Timestamp of the last frame used, frames can be processed more than once
+        self.last_seq = -1
+        self.last_frame = None
+        self.expansion = np.zeros(config.grid)  # Smoothed expansion rate per cell, 1/s
+        self.ttc = np.full(config.grid, np.inf)
+        self.logger = logging.getLogger(__name__)
+
+    def _allocate(self, level: np.ndarray):
+        rows, cols = self.config.grid
+        height, width = level.shape
+        # Round the decimated size down to a multiple of the grid so cells reshape cleanly
+        small_w = max(cols, width // cols * cols)
+        small_h = max(rows, height // rows * rows)
+        self.gray = np.empty((small_h, small_w), dtype=np.uint8)
+        self.prev_gray = np.empty_like(self.gray)
+        self.flow = np.zeros((small_h, small_w, 2), dtype=np.float32)
+        self.flow_centred = np.empty_like(self.flow)
+        self.radial = np.empty((small_h, small_w), dtype=np.float32)
+
+        # Radial weights r / |r|^2 so (flow . weights) is expansion per frame
+        ys, xs = np.mgrid[0:small_h, 0:small_w].astype(np.float32)
+        rx = xs - (small_w - 1) / 2
+        ry = ys - (small_h - 1) / 2
+        r2 = rx * rx + ry * ry
+        valid = r2 >= self.config.min_radius ** 2
+        self.weights = np.zeros((small_h, small_w, 2), dtype=np.float32)
+        self.weights[..., 0] = np.where(valid, rx / np.maximum(r2, 1), 0)
+        self.weights[..., 1] = np.where(valid, ry / np.maximum(r2, 1), 0)
+        counts = valid.reshape(rows, small_h // rows, cols, small_w // cols).sum(axis=(1, 3))
+        self.cell_counts = np.maximum(counts, 1).astype(np.float32)
+
+        # Cells that matter for forward flight
+        centres_y = (np.arange(rows) + 0.5) / rows - 0.5
+        centres_x = (np.arange(cols) + 0.5) / cols - 0.5
+        half = self.config.central_fraction / 2
+        self.central = (np.abs(centres_y)[:, None] <= half) & (np.abs(centres_x)[None, :] <= half)
+
+        self.source_shape = level.shape
+        self.has_previous = False
+
+    def update(self, derived):
+        """Frame processor: update the time-to-contact grid with a new frame"""
+        # The main loop isn't paced to the stream and can hand over the same frame again, which
+        # would read as no motion. dt comes from when frames arrived, not when they are processed.
+        if derived.frame is self.last_frame or (derived.seq >= 0 and derived.seq == self.last_seq):
+            return
+        self.last_frame = derived.frame
+        self.last_seq = derived.seq
+        level = derived.pyramid(self.config.pyramid_level)
+        if self.gray is None or level.shape != self.source_shape:
+            self._allocate(level)
+        now = derived.timestamp
+        np.copyto(self.gray, level[:self.gray.shape[0], :self.gray.shape[1]])
+
+        if self.has_previous and now - self.last_update < self.config.max_frame_age:
+            dt = max(now - self.last_update, 1e-3)
+            cv2.calcOpticalFlowFarneback(self.prev_gray, self.gray, self.flow, 0.5, 2, 9, 2, 5, 1.1,
+                                         cv2.OPTFLOW_USE_INITIAL_FLOW)
+            np.subtract(self.flow, self.flow.reshape(-1, 2).mean(axis=0), out=self.flow_centred)
+            np.einsum('ijk,ijk->ij', self.flow_centred, self.weights, out=self.radial)
+
+            rows, cols = self.config.grid
+            height, width = self.radial.shape
+            cell_sum = self.radial.reshape(rows, height // rows, cols, width // cols).sum(axis=(1, 3))
+            expansion = cell_sum / self.cell_counts / dt
+
+            alpha = self.config.smoothing
+            with self.lock:
+                self.expansion = (1 - alpha) * self.expansion + alpha * expansion
+                self.ttc = np.where(self.expansion > 1e-3, 1.0 / np.maximum(self.expansion, 1e-3), np.inf)
+        else:
+            self.flow[:] = 0
+
+        self.gray, self.prev_gray = self.prev_gray, self.gray
+        self.has_previous = True
+        self.last_update = now
+
+    def min_time_to_contact(self) -> Optional[float]:
+        """Smallest time to contact over the central cells, None if the estimate is stale"""
+        if time.monotonic() - self.last_update > self.config.max_frame_age:
+            return None
+        with self.lock:
+            return float(self.ttc[self.central].min())
+
+    def forward_speed_cap(self, max_speed: int) -> int:
+        """Highest forward rc value that is safe given the time to contact ahead"""
+        ttc = self.min_time_to_contact()
+        if ttc is None:
+            return max_speed
+        fraction = (ttc - self.config.ttc_stop) / (self.config.ttc_slow - self.config.ttc_stop)
+        return int(max_speed * float(np.clip(fraction, 0.0, 1.0)))
@@ -0,0 +1,184 @@
+import numpy as np
+import cv2
+import math
+import threading
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass
+class OdometryConfig:
+    """Configuration for optical-flow visual odometry and hover drift hold"""
+    pyramid_level: int = 2  # Gray pyramid level to track on, 2 is quarter size
+    horizontal_fov: float = 70.0  # Degrees, used to turn pixel shifts into angles
+    max_features: int = 80
+    min_features: int = 25  # Re-detect features when fewer than this survive
+    quality_level: float = 0.01
+    min_distance: int = 8
+    lk_window: Tuple[int, int] = (15, 15)
+    lk_levels: int = 2
+    max_residual: float = 1.5  # Pixels (downscaled) before a track counts as an outlier
+    min_inliers: int = 8
+    gain_lr: float = 150.0  # rc per radian of lateral drift
+    gain_ud: float = 150.0  # rc per radian of vertical drift
+    gain_fb: float = 120.0  # rc per unit of log scale change
+    gain_yaw: float = 1.0  # rc per degree of yaw drift
+    deadband: float = 0.01  # Radians / log scale ignored as noise
+    max_correction: int = 15
+
+
+@dataclass
+class FrameMotion:
+    """Frame-to-frame image motion about the image centre, in downscaled pixels"""
+    tx: float
+    ty: float
+    rotation: float  # Radians, in-plane
+    log_scale: float
+    inliers: int
+
+
+def estimate_similarity(p: np.ndarray, q: np.ndarray, max_residual: float) -> Optional[FrameMotion]:
+    """
+    Least-squares similarity transform q ~ s*R*p + t between two (N, 2) point sets,
+    refitted once without outliers. Points should already be relative to the image centre.
+    """
+    # Seed the inliers from the median displacement, frame-to-frame motion is mostly a shift
+    displacement = q - p
+    deviation = np.abs(displacement - np.median(displacement, axis=0)).sum(axis=1)
+    inliers = deviation < max(3 * np.median(deviation), max_residual)
+    for _ in range(2):
+        pi = p[inliers]
+        qi = q[inliers]
+        if len(pi) < 3:
+            return None
+        p_mean = pi.mean(axis=0)
+        q_mean = qi.mean(axis=0)
+        pc = pi - p_mean
+        qc = qi - q_mean
+        denom = np.einsum('ij,ij->', pc, pc)
+        if denom < 1e-6:
+            return None
+        a = np.einsum('ij,ij->', pc, qc) / denom
+        b = (pc[:, 0] @ qc[:, 1] - pc[:, 1] @ qc[:, 0]) / denom
+        rotation = np.array([[a, -b], [b, a]])
+        t = q_mean - rotation @ p_mean
+
+        residual = q - (p @ rotation.T + t)
+        inliers = np.einsum('ij,ij->i', residual, residual) < max_residual * max_residual
+
+    return FrameMotion(float(t[0]), float(t[1]), math.atan2(b, a),
+                       math.log(max(math.hypot(a, b), 1e-6)), int(inliers.sum()))
+
+
+class VisualOdometry:
+    """
+    Tracks sparse features with pyramidal Lucas-Kanade and accumulates image drift.
+
+    Horizontal image shift can't tell yaw from sideways drift on its own, so the drone's
+    IMU yaw is used to split it: the yaw part is corrected with yaw, the rest with lr.
+    """
+    def __init__(self, config: OdometryConfig = OdometryConfig()):
+        self.config = config
+        self.lock = threading.Lock()
+        self.prev_gray = None
+        self.points = np.empty((config.max_features, 1, 2), dtype=np.float32)
+        self.num_points = 0
+        self.centre = np.zeros(2, dtype=np.float32)
+        self.focal = 1.0
+        self.lk_params = dict(winSize=config.lk_window, maxLevel=config.lk_levels,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        # Accumulated since the hold started: tx, ty (downscaled px) and log scale
+        self.drift = np.zeros(3)
+        self.holding = False
+        self.reference_yaw = 0.0
+        self.last_motion: Optional[FrameMotion] = None
+        self.logger = logging.getLogger(__name__)
+
+    def _allocate(self, gray: np.ndarray):
+        height, width = gray.shape
+        self.prev_gray = np.empty_like(gray)
+        self.centre[:] = (width / 2, height / 2)
+        self.focal = (width / 2) / math.tan(math.radians(self.config.horizontal_fov) / 2)
+        self.num_points = 0
+
+    def _detect_features(self, gray: np.ndarray):
+        corners = cv2.goodFeaturesToTrack(gray, self.config.max_features,
+                                          self.config.quality_level, self.config.min_distance)
+        self.num_points = 0 if corners is None else len(corners)
+        if self.num_points:
+            self.points[:self.num_points] = corners
+
+    def update(self, derived):
+        """Frame processor: track features from the previous frame into this one"""
+        gray = derived.pyramid(self.config.pyramid_level)
+        if self.prev_gray is None or gray.shape != self.prev_gray.shape:
+            self._allocate(gray)
+
+        if self.num_points:
+            previous = self.points[:self.num_points]
+            tracked, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, previous,
+                                                          None, **self.lk_params)
+            good = status.ravel() == 1
+            p = previous[good].reshape(-1, 2) - self.centre
+            q = tracked[good].reshape(-1, 2) - self.centre
+
+            motion = None
+            if len(p) >= self.config.min_inliers:
+                motion = estimate_similarity(p, q, self.config.max_residual)
+            if motion is not None and motion.inliers >= self.config.min_inliers:
+                with self.lock:
+                    self.last_motion = motion
+                    if self.holding:
+                        self.drift += (motion.tx, motion.ty, motion.log_scale)
+
+            self.num_points = int(good.sum())
+            self.points[:self.num_points] = tracked[good]
+
+        if self.num_points < self.config.min_features:
+            self._detect_features(gray)
+
+        # The cache reuses its buffers, keep our own copy of the previous level
+        np.copyto(self.prev_gray, gray)
+
+    def start_hold(self, yaw: float = 0.0):
+        """Take the current view as the position to hold"""
+        with self.lock:
+            self.drift[:] = 0
+            self.reference_yaw = yaw
+            self.holding = True
+
+    def stop_hold(self):
+        with self.lock:
+            self.holding = False
+
+    def _gain(self, error: float, gain: float) -> int:
+        if abs(error) < self.config.deadband:
+            return 0
+        limit = self.config.max_correction
+        return int(np.clip(-gain * error, -limit, limit))
+
+    def correction(self, yaw: float = 0.0) -> Tuple[int, int, int, int]:
+        """
+        Corrective rc values that steer back to where the hold started.
+
+        Args:
+            yaw: Current IMU yaw in degrees
+
+        Returns:
+            tuple: (lr, fb, ud, yv)
+        """
+        with self.lock:
+            tx, ty, log_scale = self.drift
+
+        yaw_error = math.remainder(yaw - self.reference_yaw, 360.0)
+        # Scene moves left in the image when the drone yaws or slides right
+        visual_angle = -math.atan2(tx, self.focal)
+        lateral = visual_angle - math.radians(yaw_error)
+        vertical = math.atan2(ty, self.focal)  # Scene moves down when the drone climbs
+
+        yv = 0 if abs(yaw_error) < 1.0 else self._gain(yaw_error, self.config.gain_yaw)
+        return (self._gain(lateral, self.config.gain_lr),
+                self._gain(log_scale, self.config.gain_fb),
+                self._gain(vertical, self.config.gain_ud),
+                yv)
@@ -36,4 +36,9 @@ def get_dimensions():
 
 def blit_frame(frame):
     global pygame_window
-    pygame.surfarray.blit_array(pygame_window, frame)
\ No newline at end of file
+    pygame.surfarray.blit_array(pygame_window, frame)
+
+
+def blit_overlay(surface):
+    """Composite a transparent overlay, e.g. the HUD, over the frame"""
+    pygame_window.blit(surface, (0, 0))
@@ -0,0 +1,270 @@
+import numpy as np
+import cv2
+import os
+import json
+import argparse
+import logging
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class RecognitionConfig:
+    """Configuration for face recognition against the on-disk gallery"""
+    # OpenCV SFace model: https://github.com/opencv/opencv_zoo/tree/main/models/face_recognition_sface
+    model_path: Path = Path('data/models/face_recognition_sface_2021dec.onnx')
+    gallery_dir: Path = Path('data/gallery')
+    match_threshold: float = 0.363  # Cosine similarity, SFace's recommended threshold
+    mmap_threshold: int = 2000  # Galleries with more rows than this are memory-mapped
+    crop_margin: float = 0.15  # Extra border around the cascade box before embedding
+    iou_threshold: float = 0.3  # Box overlap needed to continue a track
+    max_missed_frames: int = 10  # Frames a track survives without a matching box
+    retry_interval: int = 15  # Frames between attempts for a face that wasn't recognised
+    max_attempts: int = 3
+
+
+@dataclass
+class FaceTrack:
+    """A face followed across frames, recognised at most a few times"""
+    track_id: int
+    box: np.ndarray  # (x, y, w, h)
+    missed: int = 0
+    age: int = 0
+    name: Optional[str] = None
+    score: float = 0.0
+    attempts: int = 0
+    last_attempt: int = -1
+
+    @property
+    def centre(self) -> Tuple[int, int]:
+        x, y, w, h = self.box
+        return int(x + w // 2), int(y + h // 2)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of (x, y, w, h) boxes"""
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1)
+
+
+class FaceTracker:
+    """Greedy IoU tracker assigning stable ids to cascade detections"""
+    def __init__(self, config: RecognitionConfig = RecognitionConfig()):
+        self.config = config
+        self.tracks: Dict[int, FaceTrack] = {}
+        self.next_id = 0
+
+    def update(self, boxes: np.ndarray) -> List[FaceTrack]:
+        """Match this frame's boxes to existing tracks, returns the tracks seen this frame"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        ids = list(self.tracks)
+        matched_tracks = set()
+        matched_boxes = set()
+
+        if ids and len(boxes):
+            existing = np.array([self.tracks[i].box for i in ids], dtype=np.float32)
+            iou = box_iou(existing, boxes)
+            # Take the best remaining pair until nothing overlaps enough
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, b = np.unravel_index(flat, iou.shape)
+                if iou[t, b] < self.config.iou_threshold:
+                    break
+                if t in matched_tracks or b in matched_boxes:
+                    continue
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+                track = self.tracks[ids[t]]
+                track.box = boxes[b].astype(np.int32)
+                track.missed = 0
+                track.age += 1
+
+        for t, track_id in enumerate(ids):
+            if t not in matched_tracks:
+                track = self.tracks[track_id]
+                track.missed += 1
+                if track.missed > self.config.max_missed_frames:
+                    del self.tracks[track_id]
+
+        for b in range(len(boxes)):
+            if b not in matched_boxes:
+                self.tracks[self.next_id] = FaceTrack(self.next_id, boxes[b].astype(np.int32))
+                self.next_id += 1
+
+        return [track for track in self.tracks.values() if track.missed == 0]
+
+
+class FaceGallery:
+    """
+    Known faces as a matrix of L2-normalised embeddings with a parallel list of names.
+    Stored as names.json + embeddings.npy; large galleries are memory-mapped read-only.
+    """
+    def __init__(self, config: RecognitionConfig = RecognitionConfig()):
+        self.config = config
+        self.names: List[str] = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def names_path(self) -> Path:
+        return self.config.gallery_dir / 'names.json'
+
+    @property
+    def embeddings_path(self) -> Path:
+        return self.config.gallery_dir / 'embeddings.npy'
+
+    def load(self) -> 'FaceGallery':
+        if not self.names_path.exists() or not self.embeddings_path.exists():
+            logging.warning(f"No face gallery found in {self.config.gallery_dir}")
+            return self
+
+        self.names = json.loads(self.names_path.read_text())
+        self.embeddings = np.load(self.embeddings_path, mmap_mode='r')
+        if len(self.embeddings) <= self.config.mmap_threshold:
+            self.embeddings = np.array(self.embeddings)  # A copy in memory, ascontiguousarray would keep the map
+        if len(self.names) != len(self.embeddings):
+            raise Exception(f"Gallery is inconsistent: {len(self.names)} names, "
+                            f"{len(self.embeddings)} embeddings")
+        logging.info(f"Loaded {len(self.names)} gallery faces")
+        return self
+
+    def add(self, name: str, embedding: np.ndarray):
+        embedding = embedding.reshape(1, -1).astype(np.float32)
+        if len(self.embeddings) == 0:
+            self.embeddings = embedding
+        else:
+            self.embeddings = np.vstack([self.embeddings, embedding])
+        self.names.append(name)
+
+    def save(self):
+        """Write the gallery, replacing embeddings.npy in one step so readers never see half a file"""
+        self.config.gallery_dir.mkdir(parents=True, exist_ok=True)
+        # Drop any map of the old file first, Windows won't replace a file that is still mapped
+        self.embeddings = np.array(self.embeddings, dtype=np.float32)
+        temp_path = self.embeddings_path.with_name('embeddings.tmp.npy')
+        np.save(temp_path, self.embeddings)
+        os.replace(temp_path, self.embeddings_path)
+        self.names_path.write_text(json.dumps(self.names, indent=1))
+
+    def match(self, embeddings: np.ndarray) -> List[Tuple[Optional[str], float]]:
+        """Best gallery name and cosine similarity for each row of embeddings"""
+        if len(self.names) == 0 or len(embeddings) == 0:
+            return [(None, 0.0)] * len(embeddings)
+        similarity = embeddings @ self.embeddings.T
+        best = similarity.argmax(axis=1)
+        scores = similarity[np.arange(len(best)), best]
+        return [(self.names[i] if score >= self.config.match_threshold else None, float(score))
+                for i, score in zip(best, scores)]
+
+
+class FaceEmbedder:
+    """Computes face embeddings on the CPU with OpenCV's SFace model"""
+    INPUT_SIZE = (112, 112)
+
+    def __init__(self, config: RecognitionConfig = RecognitionConfig()):
+        self.config = config
+        try:
+            if not Path(config.model_path).exists():
+                raise FileNotFoundError(f"Face recognition model not found: {config.model_path}")
+            self.model = cv2.FaceRecognizerSF.create(str(config.model_path), "")
+        except Exception as e:
+            logging.error(f"Face embedder initialization failed: {e}")
+            raise
+
+    def embed(self, img: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """L2-normalised embeddings for each (x, y, w, h) box, one row per box"""
+        height, width = img.shape[:2]
+        rows = []
+        for x, y, w, h in boxes:
+            margin_x = int(w * self.config.crop_margin)
+            margin_y = int(h * self.config.crop_margin)
+            x1, y1 = max(0, x - margin_x), max(0, y - margin_y)
+            x2, y2 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+            crop = cv2.resize(img[y1:y2, x1:x2], self.INPUT_SIZE)
+            rows.append(self.model.feature(crop).reshape(-1))
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = np.vstack(rows).astype(np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-6)
+        return embeddings
+
+
+class FaceRecognizer:
+    """
+    Names tracked faces. Each track is embedded and matched once; faces that don't match
+    are retried a few times as the view improves, then left alone.
+    """
+    def __init__(self, config: RecognitionConfig = RecognitionConfig()):
+        self.config = config
+        self.tracker = FaceTracker(config)
+        self.embedder = FaceEmbedder(config)
+        self.gallery = FaceGallery(config).load()
+        self.frame_count = 0
+
+    def _needs_recognition(self, track: FaceTrack) -> bool:
+        if track.name is not None or track.attempts >= self.config.max_attempts:
+            return False
+        return track.last_attempt < 0 or self.frame_count - track.last_attempt >= self.config.retry_interval
+
+    def update(self, img: np.ndarray, boxes: np.ndarray) -> List[FaceTrack]:
+        """Track this frame's face boxes and recognise any track not yet named"""
+        self.frame_count += 1
+        tracks = self.tracker.update(boxes)
+        pending = [track for track in tracks if self._needs_recognition(track)]
+        if pending:
+            embeddings = self.embedder.embed(img, np.array([track.box for track in pending]))
+            for track, (name, score) in zip(pending, self.gallery.match(embeddings)):
+                track.attempts += 1
+                track.last_attempt = self.frame_count
+                track.name, track.score = name, score
+                if name is not None:
+                    logging.info(f"Recognised {name} (track {track.track_id}, score {score:.2f})")
+        return tracks
+
+    def find(self, name: str) -> Optional[FaceTrack]:
+        """The visible track recognised as name, if any"""
+        for track in self.tracker.tracks.values():
+            if track.name == name and track.missed == 0:
+                return track
+        return None
+
+
+def enrol(name: str, image_paths: List[Path], config: RecognitionConfig = RecognitionConfig()):
+    """Add the largest face in each image to the gallery under name"""
+    import tello_video  # only needed here for the cascade detector
+
+    detector = tello_video.FaceDetector()
+    embedder = FaceEmbedder(config)
+    gallery = FaceGallery(config).load()
+    gallery.embeddings = np.array(gallery.embeddings)  # Copy into memory, the file is rewritten below
+
+    for path in image_paths:
+        img = cv2.imread(str(path))
+        if img is None:
+            logging.warning(f"Could not read {path}")
+            continue
+        boxes = detector.detect_faces(img)
+        if len(boxes) == 0:
+            logging.warning(f"No face found in {path}")
+            continue
+        largest = boxes[np.argmax(boxes[:, 2] * boxes[:, 3])]
+        gallery.add(name, embedder.embed(img, largest.reshape(1, 4))[0])
+        logging.info(f"Enrolled {name} from {path}")
+
+    gallery.save()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add faces to the recognition gallery")
+    parser.add_argument('name', help="name to enrol the faces under")
+    parser.add_argument('images', nargs='+', type=Path, help="images containing the person's face")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    enrol(args.name, args.images)
@@ -0,0 +1,299 @@
+import os
+import hmac
+import json
+import socket
+import ipaddress
+import struct
+import threading
+import time
+import argparse
+import logging
+import numpy as np
+import cv2
+from dataclasses import dataclass, field
+from typing import Optional, Set, Tuple
+import tello_input
+
+# Video frames are sent as a 4-byte big-endian length followed by the JPEG bytes
+FRAME_HEADER = struct.Struct('>I')
+
+
+@dataclass
+class RemoteConfig:
+    """Configuration for headless operation over the local network"""
+    host: str = '127.0.0.1'  # Listening on the network ('0.0.0.0') needs a token
+    # Shared secret clients send first on both connections, whoever has it can fly the drone
+    token: Optional[str] = field(default_factory=lambda: os.environ.get('TELLO_REMOTE_TOKEN'))
+    handshake_timeout: float = 2.0  # Seconds a new client has to send the token
+    control_port: int = 9000  # Newline-delimited JSON control intents
+    video_port: int = 9001  # Length-prefixed JPEG frames
+    video_width: int = 480  # Frames are downscaled to this width before encoding
+    jpeg_quality: int = 70
+    max_video_fps: float = 15.0
+    intent_timeout: float = 0.5  # Seconds without a message before held keys are released
+
+
+class RemoteControlServer(tello_input.InputBackend):
+    """
+    Accepts control intents from ground-station clients and streams the video to them.
+
+    Clients send one JSON object per line: {"keys": ["w", "UP"]} with the currently held
+    key names (same names as ControlConfig), {"snapshot": true} or {"quit": true}. When a
+    token is configured, the first line on both connections must be {"token": "..."}.
+    Video is encoded once per frame and each client always gets the newest frame, so
+    frames are dropped for slow clients instead of queueing up.
+    """
+    def __init__(self, config: RemoteConfig = RemoteConfig()):
+        self.config = config
+        self.running = False
+        self.lock = threading.Lock()
+        self.keys: Set[str] = set()
+        self.last_intent_time = 0.0
+        self.snapshot_requested = False
+        self.encode_lock = threading.Lock()
+        self.frame_ready = threading.Condition()
+        self.latest_frame: Optional[np.ndarray] = None
+        self.latest_seq = -1
+        self.encoded_seq = -1
+        self.encoded = b''
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.sockets = []
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self.config.token is None and not is_loopback(self.config.host):
+            raise ValueError(f"Refusing to hand flight control to anyone on {self.config.host} without a token, "
+                             f"set TELLO_REMOTE_TOKEN or listen on 127.0.0.1")
+        self.running = True
+        for port, handler in ((self.config.control_port, self._control_client),
+                              (self.config.video_port, self._video_client)):
+            server = socket.create_server((self.config.host, port))
+            server.settimeout(0.5)
+            self.sockets.append(server)
+            threading.Thread(target=self._accept_loop, args=(server, handler), daemon=True).start()
+        self.logger.info(f"Remote control on port {self.config.control_port}, "
+                         f"video on port {self.config.video_port}")
+
+    def stop(self):
+        self.running = False
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+        for server in self.sockets:
+            server.close()
+        self.sockets = []
+
+    def _accept_loop(self, server: socket.socket, handler):
+        while self.running:
+            try:
+                client, address = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.logger.info(f"Client connected from {address}")
+            threading.Thread(target=self._serve_client, args=(client, address, handler), daemon=True).start()
+
+    def _serve_client(self, client: socket.socket, address, handler):
+        reader = client.makefile('r', encoding='utf-8')
+        if not self._authenticate(client, reader):
+            self.logger.warning(f"Client {address} did not send the token, disconnected")
+            reader.close()
+            client.close()
+            return
+        handler(client, reader)
+
+    def _authenticate(self, client: socket.socket, reader) -> bool:
+        """Check the client's first line against the token, always passes without one"""
+        if self.config.token is None:
+            return True
+        client.settimeout(self.config.handshake_timeout)
+        try:
+            hello = json.loads(reader.readline())
+        except (OSError, ValueError):
+            return False
+        finally:
+            client.settimeout(None)
+        token = hello.get('token') if isinstance(hello, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'),
+                                                              self.config.token.encode('utf-8'))
+
+    # Control
+
+    def _control_client(self, client: socket.socket, reader):
+        with client, reader:
+            for line in reader:
+                if not self.running:
+                    break
+                try:
+                    self._handle_intent(json.loads(line))
+                except (ValueError, TypeError) as e:
+                    self.logger.warning(f"Bad control message {line!r}: {e}")
+        # Connection gone, let go of everything
+        with self.lock:
+            self.keys = set()
+
+    def _handle_intent(self, intent):
+        if not isinstance(intent, dict):
+            raise TypeError(f"expected a JSON object, got {type(intent).__name__}")
+        keys = intent.get('keys')
+        if keys is not None and not (isinstance(keys, list) and all(isinstance(k, str) for k in keys)):
+            raise TypeError("keys must be a list of key names")
+        with self.lock:
+            if keys is not None:
+                self.keys = set(keys)
+            self.last_intent_time = time.monotonic()
+        if intent.get('snapshot'):
+            self.snapshot_requested = True
+        if intent.get('quit'):
+            self.running = False
+
+    def get_key(self, key_name: str) -> bool:
+        """Key state as sent by the client, all keys are released if it goes quiet"""
+        with self.lock:
+            if time.monotonic() - self.last_intent_time > self.config.intent_timeout:
+                return False
+            return key_name in self.keys
+
+    def pop_snapshot_request(self) -> bool:
+        requested, self.snapshot_requested = self.snapshot_requested, False
+        return requested
+
+    # Video
+
+    def publish_frame(self, derived):
+        """Frame processor: hand the newest frame to the video senders"""
+        with self.frame_ready:
+            self.latest_frame = derived.frame
+            self.latest_seq = derived.seq
+            self.frame_ready.notify_all()
+
+    def _encode_latest(self) -> Tuple[int, bytes]:
+        """JPEG of the newest frame, encoded once however many clients there are"""
+        with self.encode_lock:
+            if self.encoded_seq != self.latest_seq:
+                frame = self.latest_frame
+                height, width = frame.shape[:2]
+                size = (self.config.video_width, max(1, height * self.config.video_width // width))
+                small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                ok, jpeg = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, self.config.jpeg_quality])
+                if ok:
+                    self.encoded = jpeg.tobytes()
+                    self.encoded_seq = self.latest_seq
+            return self.encoded_seq, self.encoded
+
+    def _video_client(self, client: socket.socket, reader):
+        reader.close()  # Only the handshake is read, the rest of the connection is video out
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        min_interval = 1.0 / self.config.max_video_fps
+        sent_seq = -1
+        last_send = 0.0
+        try:
+            while self.running:
+                with self.frame_ready:
+                    self.frame_ready.wait_for(lambda: self.latest_seq != sent_seq or not self.running, timeout=1.0)
+                if not self.running or self.latest_seq == sent_seq:
+                    continue
+                delay = min_interval - (time.monotonic() - last_send)
+                if delay > 0:
+                    time.sleep(delay)
+
+                seq, jpeg = self._encode_latest()
+                if sent_seq >= 0 and seq > sent_seq + 1:
+                    self.frames_dropped += seq - sent_seq - 1
+                # Blocks while the client catches up, newer frames replace older ones meanwhile
+                client.sendall(FRAME_HEADER.pack(len(jpeg)) + jpeg)
+                sent_seq = seq
+                last_send = time.monotonic()
+                self.frames_sent += 1
+        except OSError as e:
+            self.logger.info(f"Video client disconnected: {e}")
+        finally:
+            client.close()
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class GroundStation:
+    """Minimal client: shows the video in a pygame window and sends the held keys"""
+    def __init__(self, host: str, config: RemoteConfig = RemoteConfig(), send_rate: float = 20.0):
+        self.host = host
+        self.config = config
+        self.send_rate = send_rate
+        self.frame: Optional[np.ndarray] = None
+        self.running = False
+
+    def _receive_video(self, video: socket.socket):
+        reader = video.makefile('rb')
+        while self.running:
+            header = reader.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            jpeg = reader.read(FRAME_HEADER.unpack(header)[0])
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                self.frame = frame
+        self.running = False
+
+    def run(self):
+        import pygame
+
+        control = socket.create_connection((self.host, self.config.control_port))
+        video = socket.create_connection((self.host, self.config.video_port))
+        if self.config.token is not None:
+            hello = (json.dumps({'token': self.config.token}) + '\n').encode('utf-8')
+            control.sendall(hello)
+            video.sendall(hello)
+        self.running = True
+        threading.Thread(target=self._receive_video, args=(video,), daemon=True).start()
+
+        pygame.init()
+        window = None
+        key_codes = [(name[2:], getattr(pygame, name)) for name in dir(pygame) if name.startswith('K_')]
+        period = 1.0 / self.send_rate
+        try:
+            while self.running:
+                message = {}
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                        message['quit'] = True
+                        self.running = False
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_z:
+                        message['snapshot'] = True
+
+                pressed = pygame.key.get_pressed()
+                message['keys'] = [name for name, code in key_codes if pressed[code]]
+                control.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+                frame = self.frame
+                if frame is not None:
+                    height, width = frame.shape[:2]
+                    if window is None or window.get_size() != (width, height):
+                        window = pygame.display.set_mode((width, height))
+                    # Frames arrive as BGR like the drone's own, show them the same way
+                    pygame.surfarray.blit_array(window, frame.swapaxes(0, 1))
+                    pygame.display.update()
+                time.sleep(period)
+        finally:
+            self.running = False
+            control.close()
+            video.close()
+            pygame.quit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ground station for a headless tello_main")
+    parser.add_argument('host', help="address of the machine running tello_main.py --headless")
+    parser.add_argument('--token', default=RemoteConfig().token,
+                        help="shared token set on the drone side (default: $TELLO_REMOTE_TOKEN)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    GroundStation(args.host, RemoteConfig(token=args.token)).run()
@@ -0,0 +1,167 @@
+import asyncio
+import argparse
+import math
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import tello_command
+
+
+@dataclass
+class SimulatorConfig:
+    """Configuration for the local Tello simulator"""
+    host: str = '127.0.0.1'
+    command_port: int = tello_command.TELLO_COMMAND_PORT
+    state_port: int = tello_command.TELLO_STATE_PORT  # Port on the client that state packets go to
+    state_rate: float = 10.0  # Hz, roughly what the real drone sends
+    response_delay: float = 0.005  # Seconds to process an ordinary command
+    takeoff_delay: float = 0.5  # Seconds before takeoff/land is acknowledged
+    battery: int = 87
+    takeoff_height: int = 80  # cm
+
+
+class SimulatedTello(asyncio.DatagramProtocol):
+    """
+    Minimal stand-in for a Tello in SDK mode, used to exercise the controller without hardware.
+
+    Commands are processed one at a time in arrival order like the real drone. rc commands
+    drive a simple kinematic model that feeds the state packets: vgx/vgy are body-frame
+    forward/right speeds in dm/s, h is height in cm and yaw is in degrees.
+    """
+    def __init__(self, config: SimulatorConfig = SimulatorConfig()):
+        self.config = config
+        self.transport = None
+        self.client: Optional[Tuple[str, int]] = None
+        self.busy_until = 0.0
+        self.rc = (0, 0, 0, 0)
+        self.flying = False
+        self.stream_on = False
+        self.height = 0.0
+        self.yaw = 0.0
+        self.battery = config.battery
+        self.commands_received = 0
+        self.state_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.config.host, self.config.command_port
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=self.address)
+        self.state_task = asyncio.create_task(self._send_state())
+        self.logger.info(f"Simulated Tello listening on {self.address}")
+
+    def stop(self):
+        if self.state_task is not None:
+            self.state_task.cancel()
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        command = data.decode('utf-8', errors='ignore').strip()
+        self.commands_received += 1
+
+        if command.startswith('rc '):
+            try:
+                self.rc = tuple(max(-100, min(100, int(v))) for v in command.split()[1:5])
+            except ValueError:
+                pass
+            return
+
+        response, delay = self._execute(command, addr)
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.busy_until = max(now, self.busy_until) + delay
+        loop.call_at(self.busy_until, self._reply, response, addr)
+
+    def _reply(self, response: str, addr):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(response.encode('utf-8'), addr)
+
+    def _execute(self, command: str, addr) -> Tuple[str, float]:
+        delay = self.config.response_delay
+        if command == 'command':
+            self.client = addr
+            return 'ok', delay
+        if command == 'takeoff':
+            self.flying = True
+            self.height = self.config.takeoff_height
+            return 'ok', self.config.takeoff_delay
+        if command == 'land':
+            self.flying = False
+            self.height = 0.0
+            self.rc = (0, 0, 0, 0)
+            return 'ok', self.config.takeoff_delay
+        if command in ('emergency', 'stop'):
+            self.rc = (0, 0, 0, 0)
+            if command == 'emergency':
+                self.flying = False
+                self.height = 0.0
+            return 'ok', delay
+        if command in ('streamon', 'streamoff'):
+            self.stream_on = command == 'streamon'
+            return 'ok', delay
+        if command.startswith('flip '):
+            return ('ok' if self.flying else 'error Not joystick'), delay
+        if command == 'battery?':
+            return str(self.battery), delay
+        if command == 'height?':
+            return f"{int(self.height)}dm", delay
+        if command == 'sdk?':
+            return '20', delay
+        return 'ok', delay
+
+    def state_packet(self) -> bytes:
+        lr, fb, ud, yv = self.rc if self.flying else (0, 0, 0, 0)
+        fields = {
+            'mid': -1, 'x': 0, 'y': 0, 'z': 0, 'pitch': 0, 'roll': 0, 'yaw': int(self.yaw),
+            'vgx': fb // 10, 'vgy': lr // 10, 'vgz': ud // 10,
+            'templ': 60, 'temph': 63, 'tof': int(self.height) + 10, 'h': int(self.height),
+            'bat': self.battery, 'baro': 0.0, 'time': 0, 'agx': 0.0, 'agy': 0.0, 'agz': -1000.0,
+        }
+        return (';'.join(f"{k}:{v}" for k, v in fields.items()) + ';\r\n').encode('ascii')
+
+    async def _send_state(self):
+        period = 1.0 / self.config.state_rate
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(period)
+            now = time.monotonic()
+            dt, last = now - last, now
+            if self.flying:
+                _, _, ud, yv = self.rc
+                self.height = max(20.0, self.height + ud * dt)
+                self.yaw = math.remainder(self.yaw + yv * dt, 360.0)
+            if self.client is not None and self.transport is not None:
+                self.transport.sendto(self.state_packet(), (self.client[0], self.config.state_port))
+
+
+async def serve(config: SimulatorConfig = SimulatorConfig()):
+    simulator = SimulatedTello(config)
+    await simulator.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a simulated Tello on the local machine")
+    parser.add_argument('--host', default=SimulatorConfig.host)
+    parser.add_argument('--port', type=int, default=SimulatorConfig.command_port)
+    parser.add_argument('--delay', type=float, default=SimulatorConfig.response_delay,
+                        help="seconds to process each command")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(SimulatorConfig(host=args.host, command_port=args.port, response_delay=args.delay)))
+    except KeyboardInterrupt:
+        pass
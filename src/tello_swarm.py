@@ -0,0 +1,239 @@
+import asyncio
+import argparse
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import tello_async
+import tello_blackbox
+import tello_command
+import tello_keyboard
+import tello_pygame
+import tello_sim
+
+
+@dataclass
+class SwarmConfig:
+    """Configuration for flying several Tellos in station mode"""
+    # Command address of each drone, they need joining to the same wifi network first
+    drones: List[Tuple[str, int]] = field(default_factory=list)
+    state_port: int = tello_command.TELLO_STATE_PORT
+    command: tello_command.CommandChannelConfig = field(default_factory=tello_command.CommandChannelConfig)
+    state_timeout: float = 3.0
+    control_rate: float = 20.0  # Hz
+    ui_rate: float = 60.0  # Hz
+
+
+@dataclass
+class FormationSlot:
+    """Per-drone transform applied to group patrol commands, e.g. lr=-1 mirrors sideways moves"""
+    lr: int = 1
+    fb: int = 1
+    ud: int = 1
+    yv: int = 1
+
+
+# patrol script for the whole swarm, the pair fly apart and back together
+formation_patrol_script = [
+    tello_keyboard.Command("lr", {"speed": 30}, 2),
+    tello_keyboard.Command("fb", {"speed": 40}, 2),
+    tello_keyboard.Command("lr", {"speed": -30}, 2),
+    tello_keyboard.Command("fb", {"speed": -40}, 2),
+]
+mirrored_pair = [FormationSlot(), FormationSlot(lr=-1)]
+
+
+class Swarm:
+    """
+    Several AsyncTello links multiplexed over one command endpoint and one state
+    endpoint on a single event loop, with a DroneController per drone.
+    """
+    def __init__(self, config: SwarmConfig = SwarmConfig()):
+        self.config = config
+        self.drones: List[tello_async.AsyncTello] = []
+        self.controllers: List[tello_keyboard.DroneController] = []
+        self.command_router: Optional[tello_command.DatagramRouter] = None
+        self.state_router: Optional[tello_command.DatagramRouter] = None
+        self.logger = logging.getLogger(__name__)
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        _, self.command_router = await loop.create_datagram_endpoint(
+            tello_command.DatagramRouter, local_addr=('0.0.0.0', 0))
+        _, self.state_router = await loop.create_datagram_endpoint(
+            tello_command.DatagramRouter, local_addr=('0.0.0.0', self.config.state_port))
+
+        # Drones are told apart by ip, or by ip and port when they share an ip (simulators)
+        ip_counts = Counter(ip for ip, _ in self.config.drones)
+        connecting = []
+        for ip, port in self.config.drones:
+            drone = tello_async.AsyncTello(tello_async.AsyncRuntimeConfig(
+                tello_ip=ip, command_port=port, state_port=self.config.state_port,
+                command=self.config.command, state_timeout=self.config.state_timeout))
+            self.drones.append(drone)
+            self.controllers.append(tello_keyboard.DroneController(video_manager=None))
+            route_key = ip if ip_counts[ip] == 1 else (ip, port)
+            connecting.append(drone.connect(self.command_router, self.state_router, route_key))
+        await asyncio.gather(*connecting)
+        self.logger.info(f"Swarm of {len(self.drones)} connected")
+
+    async def group_command(self, command: str) -> List[tello_command.CommandResult]:
+        """
+        Send the same command to every drone at once and wait for all the replies.
+
+        Returns:
+            list: A CommandResult per drone, one that raised (no reply after the retries) gets a
+            failed result with seq -1 and the error as its response
+        """
+        outcomes = await asyncio.gather(*(drone.command(command) for drone in self.drones),
+                                        return_exceptions=True)
+        results = []
+        for drone, outcome in zip(self.drones, outcomes):
+            if isinstance(outcome, Exception):
+                outcome = tello_command.CommandResult(-1, command, f"error {outcome}", 0.0, 0)
+            if not outcome.ok:
+                self.logger.error(f"{drone.address}: '{command}' failed with '{outcome.response}'")
+            results.append(outcome)
+        return results
+
+    async def takeoff(self):
+        for drone, result in zip(self.drones, await self.group_command('takeoff')):
+            # Without a reply the drone may well be airborne, so it is landed on close either way
+            drone.is_flying = drone.is_flying or result.ok or result.seq < 0
+
+    async def land(self):
+        self.send_rc_all((0, 0, 0, 0))
+        for drone, result in zip(self.drones, await self.group_command('land')):
+            drone.is_flying = drone.is_flying and not result.ok
+
+    def send_rc_all(self, rc: Tuple[int, int, int, int], formation: Optional[List[FormationSlot]] = None):
+        """Send one rc command to every drone in the same loop iteration"""
+        lr, fb, ud, yv = rc
+        for index, drone in enumerate(self.drones):
+            slot = formation[index] if formation and index < len(formation) else FormationSlot()
+            drone.channel.send_unacked(f"rc {lr * slot.lr} {fb * slot.fb} {ud * slot.ud} {yv * slot.yv}")
+
+    async def run_formation(self, script: List[tello_keyboard.Command],
+                            formation: Optional[List[FormationSlot]] = None, loops: int = 1):
+        """Fly a patrol script with every drone in step, each through its formation slot"""
+        period = 1.0 / self.config.control_rate
+        axes = ('lr', 'fb', 'ud', 'yv')
+        for _ in range(loops):
+            for command in script:
+                rc = tuple(command.params['speed'] if axis == command.action else 0 for axis in axes)
+                end = time.monotonic() + command.duration
+                while time.monotonic() < end:
+                    self.send_rc_all(rc, formation)
+                    await asyncio.sleep(period)
+        self.send_rc_all((0, 0, 0, 0))
+
+    async def run_keyboard(self):
+        """Fly every drone from the keyboard, each through its own DroneController"""
+        tello_pygame.initialise_pygame()
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.drones)), thread_name_prefix='swarm-control')
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.config.control_rate
+        try:
+            while tello_pygame.update_pygame():
+                ticks = [loop.run_in_executor(executor, controller.update_controls, drone)
+                         for controller, drone in zip(self.controllers, self.drones)]
+                await asyncio.gather(*ticks)
+                await asyncio.sleep(period)
+        finally:
+            await asyncio.to_thread(executor.shutdown, wait=True)
+            tello_pygame.quit_pygame()
+
+    def latency_stats(self) -> Dict[Tuple[str, int], Dict[str, Dict[str, float]]]:
+        return {drone.address: drone.channel.latency_stats() for drone in self.drones}
+
+    async def close(self):
+        await asyncio.gather(*(drone.close() for drone in self.drones), return_exceptions=True)
+        for router in (self.command_router, self.state_router):
+            if router is not None and router.transport is not None:
+                router.transport.close()
+
+
+async def benchmark(sizes=(1, 2, 4, 8, 16), queries: int = 100, base_port: int = 19000,
+                    state_port: int = 18890) -> Dict[int, Dict[str, float]]:
+    """
+    Per-drone command round-trip latency against local simulators as the swarm grows.
+    Every drone issues its queries concurrently with the others.
+    """
+    results = {}
+    for size in sizes:
+        # Fresh ports each round, closed endpoints are released asynchronously
+        simulators = [tello_sim.SimulatedTello(tello_sim.SimulatorConfig(
+            command_port=base_port + i, state_port=state_port)) for i in range(size)]
+        base_port += size
+        for simulator in simulators:
+            await simulator.start()
+
+        swarm = Swarm(SwarmConfig(drones=[simulator.address for simulator in simulators],
+                                  state_port=state_port))
+        try:
+            await swarm.connect()
+
+            async def query_loop(drone):
+                for _ in range(queries):
+                    await drone.command('battery?')
+
+            await asyncio.gather(*(query_loop(drone) for drone in swarm.drones))
+            latencies = sorted(latency for drone in swarm.drones
+                               for latency in drone.channel.latencies['battery?'])
+            results[size] = {
+                'mean_ms': 1000 * sum(latencies) / len(latencies),
+                'p50_ms': 1000 * latencies[len(latencies) // 2],
+                'p95_ms': 1000 * latencies[int(len(latencies) * 0.95)],
+                'max_ms': 1000 * latencies[-1],
+            }
+        finally:
+            await swarm.close()
+            for simulator in simulators:
+                simulator.stop()
+    return results
+
+
+async def fly_formation(config: SwarmConfig):
+    swarm = Swarm(config)
+    try:
+        await swarm.connect()
+        await swarm.takeoff()
+        await swarm.run_formation(formation_patrol_script, mirrored_pair)
+        await swarm.land()
+    finally:
+        await swarm.close()
+
+
+async def fly_keyboard(config: SwarmConfig):
+    swarm = Swarm(config)
+    try:
+        await swarm.connect()
+        await swarm.run_keyboard()
+    finally:
+        await swarm.close()
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    ip, _, port = text.partition(':')
+    return ip, int(port or tello_command.TELLO_COMMAND_PORT)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fly several Tellos in station mode")
+    parser.add_argument('drones', nargs='*', type=parse_address, help="drone addresses as ip[:port]")
+    parser.add_argument('--formation', action='store_true', help="take off, fly the formation patrol and land")
+    parser.add_argument('--benchmark', action='store_true', help="measure command latency against simulators")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.benchmark:
+        for size, stats in asyncio.run(benchmark()).items():
+            print(f"{size:3d} drones: " + ", ".join(f"{key} {value:.2f}" for key, value in stats.items()))
+    else:
+        tello_blackbox.install()
+        if args.formation:
+            asyncio.run(fly_formation(SwarmConfig(drones=args.drones)))
+        else:
+            asyncio.run(fly_keyboard(SwarmConfig(drones=args.drones)))
@@ -0,0 +1,366 @@
+import json
+import math
+import random
+import argparse
+import logging
+import dataclasses
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+import tello_input
+import tello_keyboard
+
+# DroneConfig parameter -> (low, high) per trial group, int bounds are searched as ints.
+# DroneConfig.countersteer is left out: apply_countersteer never returns a speed of the
+# opposite sign, so it can't change what the axis trials fly.
+SEARCH_SPACE = {
+    'tracking': {'tracking_yaw_gain': (0.01, 0.5), 'tracking_max_speed': (5, 60)},
+    'axis': {'acceleration_rate': (1, 20), 'speed_falloff': (1, 20)},
+}
+
+
+@dataclass
+class PlantConfig:
+    """Simple drone and camera model the trials fly against"""
+    rate: float = 30.0  # Hz, video frames in tracking trials and control ticks in axis trials
+    yaw_per_unit: float = 1.0  # deg/s of yaw rate per rc unit
+    yaw_lag: float = 0.2  # Seconds, first-order time constant of the yaw rate
+    speed_per_unit: float = 1.0  # cm/s per rc unit
+    speed_lag: float = 0.35  # Seconds, likewise for forward speed
+    video_latency: float = 0.15  # Seconds from the camera seeing a face to the detection arriving
+    pixel_noise: float = 3.0  # px, standard deviation of detected face centres
+    frame_width: int = 960
+    face_distance: float = 100.0  # cm, DroneConfig.follow_distance so only yaw is exercised
+
+
+@dataclass
+class TuningConfig:
+    """Search settings and how trial metrics are weighted into one score, lower is better"""
+    candidates: int = 200  # Random candidates per group, plus the current settings
+    refine: int = 50  # Candidates sampled around the best one afterwards
+    refine_spread: float = 0.2  # Fraction of each parameter's range used when refining
+    seeds: int = 3  # Noise seeds every candidate is flown with
+    seed: int = 0
+    workers: Optional[int] = None  # Processes, None for one per CPU
+    settle_band: float = 2.0  # Degrees, yaw error counted as settled
+    stop_band: float = 5.0  # cm/s, speed counted as stopped
+    tracking_weights: Dict[str, float] = field(default_factory=lambda: {
+        'settling': 1.0,  # per second
+        'overshoot': 0.1,  # per degree
+        'effort': 1.0,  # mean |rc| as a fraction of max_speed
+        'chatter': 2.0,  # summed squared rc change per second, as a fraction of max_speed
+        'lost': 5.0,  # fraction of frames with the face out of view
+    })
+    axis_weights: Dict[str, float] = field(default_factory=lambda: {
+        'settling': 1.0,  # rise plus stop time, seconds
+        'overshoot': 0.05,  # per cm/s of reverse speed after letting go
+        'chatter': 2.0,
+    })
+    output: Path = Path('data/tuning/profile.json')
+
+
+@dataclass
+class TargetScenario:
+    """Bearing of the face relative to the drone's starting heading, positive to the right"""
+    name: str
+    start: float  # Degrees at t=0
+    rate: float = 0.0  # deg/s the person walks round at until move_time
+    move_time: float = 0.0
+    duration: float = 5.0
+
+    def bearing(self, t: float) -> float:
+        return self.start + self.rate * min(t, self.move_time)
+
+
+TRACKING_SCENARIOS = (
+    TargetScenario('step right', 20.0),
+    TargetScenario('step left', -30.0),
+    TargetScenario('walk', 0.0, rate=15.0, move_time=2.0, duration=6.0),
+)
+
+# Forward, let go, back, let go: rise and stop times of the keyboard ramping
+AXIS_SCRIPT = [
+    tello_input.ScriptStep(2.0, keys={'w'}),
+    tello_input.ScriptStep(2.0),
+    tello_input.ScriptStep(1.5, keys={'s'}),
+    tello_input.ScriptStep(2.0),
+]
+
+
+class SimClock:
+    """Clock for ScriptedBackend advanced by the trial, not by real time"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, dt: float):
+        self.now += dt
+
+
+class SimDrone:
+    """Stands in for the Tello: keeps the last rc values and reports a level, flying drone"""
+    def __init__(self):
+        self.rc = (0, 0, 0, 0)
+        self.yaw = 0.0
+        self.is_flying = True
+
+    def send_rc_control(self, lr: int, fb: int, ud: int, yv: int):
+        self.rc = (lr, fb, ud, yv)
+
+    def get_yaw(self) -> int:
+        return int(round(self.yaw))
+
+    def get_height(self) -> int:
+        return 100
+
+    def get_battery(self) -> int:
+        return 100
+
+
+def _lag(dt: float, tau: float) -> float:
+    """Blend factor of a first-order lag over one step"""
+    return 1.0 - math.exp(-dt / tau) if tau > 0 else 1.0
+
+
+def _settle_time(errors: np.ndarray, band: float, dt: float) -> float:
+    """Time after which |error| stays inside band, the whole trial if it never does"""
+    outside = np.flatnonzero(np.abs(errors) > band)
+    if len(outside) == 0:
+        return 0.0
+    return (outside[-1] + 1) * dt
+
+
+def _chatter(rc: np.ndarray, duration: float, max_speed: int) -> float:
+    """Squared rc changes per second, so abrupt steps cost more than the same change ramped"""
+    return float(np.square(np.diff(rc) / max_speed).sum()) / duration
+
+
+def fly_tracking(params: Dict[str, float], scenario: TargetScenario, plant: PlantConfig = PlantConfig(),
+                 seed: int = 0, config: TuningConfig = TuningConfig()) -> Dict[str, float]:
+    """
+    Fly DroneController.track against a face at the bearings of scenario.
+
+    Detections arrive at the frame rate, video_latency late and with pixel noise, through
+    the detection task hand-off the async runtime uses. The yaw rate follows the rc value
+    through a first-order lag. While the face is out of view track() steers on the last
+    one for a few frames and then stops, as in flight.
+
+    Returns:
+        dict: settling, overshoot, effort, chatter and lost metrics
+    """
+    rng = np.random.default_rng(seed)
+    drone = SimDrone()
+    drone_config = dataclasses.replace(tello_keyboard.DroneConfig(), **params)
+    controller = tello_keyboard.DroneController(drone_config, video_manager=None)
+    controller.detection_task_active = True
+    model_width, model_height = controller.camera.image_size
+    width = plant.frame_width
+    controller.face_frame_size = (width, round(width * model_height / model_width))
+    camera = controller.camera.for_size(*controller.face_frame_size)
+    half_fov = math.degrees(math.atan2(width / 2, camera.fx))
+    face_width = round(camera.fx * camera.config.face_width / plant.face_distance)
+
+    dt = 1.0 / plant.rate
+    steps = int(scenario.duration * plant.rate)
+    alpha = _lag(dt, plant.yaw_lag)
+    delay = max(1, round(plant.video_latency * plant.rate))
+    seen = deque([(0.0, scenario.bearing(0.0))] * delay, maxlen=delay)  # (yaw, target) per frame in flight
+    yaw_rate = 0.0
+    errors = np.empty(steps)
+    yaws = np.empty(steps)
+    rc = np.empty(steps)
+    lost = 0
+
+    for i in range(steps):
+        yaw, target = seen[0]
+        angle = target - yaw
+        if abs(angle) < half_fov:
+            x = camera.cx + camera.fx * math.tan(math.radians(angle)) + rng.normal(0.0, plant.pixel_noise)
+            controller.detected_face = [(x, camera.cy, face_width, face_width)]
+        else:
+            controller.detected_face = None
+            lost += 1
+        controller.track(drone)
+
+        yaw_rate += (drone.rc[3] * plant.yaw_per_unit - yaw_rate) * alpha
+        drone.yaw += yaw_rate * dt
+        target = scenario.bearing((i + 1) * dt)
+        seen.append((drone.yaw, target))
+        errors[i] = target - drone.yaw
+        yaws[i] = drone.yaw
+        rc[i] = drone.rc[3]
+
+    final = scenario.bearing(scenario.duration)
+    direction = math.copysign(1.0, final) if final else 1.0
+    max_speed = drone_config.max_speed
+    return {
+        'settling': _settle_time(errors, config.settle_band, dt),
+        'overshoot': max(0.0, float(np.max(direction * (yaws - final)))),
+        'effort': float(np.mean(np.abs(rc))) / max_speed,
+        'chatter': _chatter(rc, scenario.duration, max_speed),
+        'lost': lost / steps,
+    }
+
+
+def fly_axis(params: Dict[str, float], plant: PlantConfig = PlantConfig(),
+             config: TuningConfig = TuningConfig()) -> Dict[str, float]:
+    """
+    Fly DroneController's keyboard ramping through AXIS_SCRIPT and measure the forward speed.
+
+    Returns:
+        dict: settling (mean rise plus stop time), overshoot and chatter metrics
+    """
+    clock = SimClock()
+    drone = SimDrone()
+    drone_config = dataclasses.replace(tello_keyboard.DroneConfig(), **params)
+    controller = tello_keyboard.DroneController(drone_config, video_manager=None)
+    controller.input_backend = tello_input.ScriptedBackend(AXIS_SCRIPT, clock=clock)
+
+    dt = 1.0 / plant.rate
+    duration = sum(step.duration for step in AXIS_SCRIPT)
+    steps = int(duration * plant.rate)
+    alpha = _lag(dt, plant.speed_lag)
+    top = drone_config.max_speed * plant.speed_per_unit
+    speed = 0.0
+    speeds = np.empty(steps)
+    rc = np.empty(steps)
+    for i in range(steps):
+        controller.update_controls(drone)
+        speed += (drone.rc[1] * plant.speed_per_unit - speed) * alpha
+        speeds[i] = speed
+        rc[i] = drone.rc[1]
+        clock.advance(dt)
+
+    rises, stops, overshoots = [], [], []
+    start = 0
+    for step, following in zip(AXIS_SCRIPT[::2], AXIS_SCRIPT[1::2]):
+        press_end = start + int(step.duration * plant.rate)
+        release_end = press_end + int(following.duration * plant.rate)
+        sign = 1.0 if 'w' in step.keys else -1.0
+        pressed = sign * speeds[start:press_end]
+        reached = np.flatnonzero(pressed >= 0.9 * top)
+        rises.append(reached[0] * dt if len(reached) else step.duration)
+        released = speeds[press_end:release_end]
+        stops.append(_settle_time(released, config.stop_band, dt))
+        overshoots.append(max(0.0, float(np.max(-sign * released))))
+        start = release_end
+
+    return {
+        'settling': float(np.mean(rises) + np.mean(stops)),
+        'overshoot': float(np.max(overshoots)),
+        'chatter': _chatter(rc, duration, drone_config.max_speed),
+    }
+
+
+def score(metrics: Dict[str, float], weights: Dict[str, float]) -> float:
+    return sum(weights[name] * metrics[name] for name in weights)
+
+
+def evaluate(job: Tuple[str, Dict[str, float], PlantConfig, TuningConfig]) -> dict:
+    """Fly one candidate through every trial of its group, run in the worker processes"""
+    group, params, plant, config = job
+    if group == 'tracking':
+        runs = [fly_tracking(params, scenario, plant, seed, config)
+                for scenario in TRACKING_SCENARIOS for seed in range(config.seeds)]
+        weights = config.tracking_weights
+    else:
+        runs = [fly_axis(params, plant, config)]  # No noise, one run is enough
+        weights = config.axis_weights
+    metrics = {name: float(np.mean([run[name] for run in runs])) for name in runs[0]}
+    return {'params': params, 'metrics': metrics, 'score': score(metrics, weights)}
+
+
+def current_settings(group: str) -> Dict[str, float]:
+    """The settings the search starts from, from the config defaults"""
+    defaults = tello_keyboard.DroneConfig()
+    return {name: getattr(defaults, name) for name in SEARCH_SPACE[group]}
+
+
+def sample(space: Dict[str, Tuple[float, float]], rng: random.Random,
+           around: Optional[Dict[str, float]] = None, spread: float = 1.0) -> Dict[str, float]:
+    """Uniform candidate from space, or from spread of each range around a point"""
+    params = {}
+    for name, (low, high) in space.items():
+        if around is not None:
+            half = spread * (high - low) / 2
+            low, high = max(low, around[name] - half), min(high, around[name] + half)
+        if isinstance(space[name][0], int):
+            params[name] = rng.randint(math.ceil(low), math.floor(high))
+        else:
+            params[name] = round(rng.uniform(low, high), 3)
+    return params
+
+
+def tune(config: TuningConfig = TuningConfig(), plant: PlantConfig = PlantConfig()) -> dict:
+    """
+    Random search over SEARCH_SPACE, then a narrower search around the best candidate.
+    The current settings are always flown too, so the profile never ends up worse.
+
+    Returns:
+        dict: The profile, as written by save_profile
+    """
+    rng = random.Random(config.seed)
+    results = {}
+    with ProcessPoolExecutor(config.workers) as pool:
+        for group, space in SEARCH_SPACE.items():
+            candidates = [current_settings(group)] + [sample(space, rng) for _ in range(config.candidates)]
+            flown = list(pool.map(evaluate, [(group, c, plant, config) for c in candidates], chunksize=8))
+            best = min(flown, key=lambda r: r['score'])
+            nearby = [sample(space, rng, best['params'], config.refine_spread) for _ in range(config.refine)]
+            flown += pool.map(evaluate, [(group, c, plant, config) for c in nearby], chunksize=8)
+            best = min(flown, key=lambda r: r['score'])
+            results[group] = {'best': best, 'baseline': flown[0], 'flown': len(flown)}
+            logging.info(f"{group}: score {flown[0]['score']:.3f} -> {best['score']:.3f} "
+                         f"with {best['params']} ({len(flown)} candidates)")
+
+    return {
+        'drone': {**results['tracking']['best']['params'], **results['axis']['best']['params']},
+        'results': results,
+        'plant': dataclasses.asdict(plant),
+    }
+
+
+def save_profile(profile: dict, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(profile, indent=2))
+
+
+def load_profile(path: Path) -> tello_keyboard.DroneConfig:
+    """DroneConfig defaults with a saved profile's settings applied"""
+    profile = json.loads(Path(path).read_text())
+    if 'face_track' in profile:
+        # Older profiles tuned TrackingMovement's PID, which DroneController.track doesn't use
+        logging.warning(f"{path}: ignoring face_track settings, re-run tello_tuning.py")
+    return dataclasses.replace(tello_keyboard.DroneConfig(), **profile.get('drone', {}))
+
+
+def print_results(profile: dict):
+    for group, result in profile['results'].items():
+        print(f"{group} ({result['flown']} candidates)")
+        for label in ('baseline', 'best'):
+            entry = result[label]
+            metrics = ' '.join(f"{name} {value:.3f}" for name, value in entry['metrics'].items())
+            print(f"  {label:>8}: score {entry['score']:.3f}  {entry['params']}\n            {metrics}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tune tracking and control gains on simulated flights")
+    parser.add_argument('--candidates', type=int, default=TuningConfig.candidates)
+    parser.add_argument('--refine', type=int, default=TuningConfig.refine)
+    parser.add_argument('--seed', type=int, default=TuningConfig.seed)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', type=Path, default=TuningConfig.output)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    profile = tune(TuningConfig(candidates=args.candidates, refine=args.refine, seed=args.seed,
+                                workers=args.workers))
+    save_profile(profile, args.output)
+    print_results(profile)
+    print(f"Saved {args.output}, fly with it using tello_main.py --profile {args.output}")
@@ -1,16 +1,23 @@
 import numpy as np
 import cv2
 import time
+import queue
+import multiprocessing
+import tello_blackbox
+import tello_camera
 import tello_pygame
+import tello_frame_cache
+import tello_motion_gate
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Tuple, List, Optional
+from typing import Callable, Tuple, List, Optional
 import logging
 
 # Configuration
 @dataclass
 class FaceTrackConfig:
-    fb_range: Tuple[int, int] = (6200, 6800)
+    # cm from the face, the band the old (6200, 6800) px area range gave on 1280 wide frames
+    distance_range: Tuple[float, float] = (177.0, 186.0)
     pid: Tuple[float, float, float] = (0.4, 0.4, 0)
     scale_factor: float = 1.2
     min_neighbors: int = 8
@@ -25,13 +32,18 @@ class VideoConfig:
     frame_width: int = 1280
     frame_height: int = 720
     fps_limit: int = 30
+    undistort: bool = False  # Remove lens distortion before frames reach any consumer, needs a calibration
 
 class TrackingMovement:
     """Handles drone movement based on tracking data"""
-    def __init__(self, config: FaceTrackConfig = FaceTrackConfig()):
+    def __init__(self, config: FaceTrackConfig = FaceTrackConfig(),
+                 camera: tello_camera.CameraModel = tello_camera.camera_model,
+                 clock: Callable[[], float] = time.time):
         self.config = config
+        self.camera = camera
+        self.clock = clock  # Replaceable so simulated trials run faster than real time
         self.previous_error = 0
-        self.last_movement_time = time.time()
+        self.last_movement_time = clock()
         self.movement_timeout = 0.1  # 100ms minimum between movements
 
     def track_face(self, drone, info, width) -> Tuple[int, dict]:
@@ -41,39 +53,43 @@ class TrackingMovement:
         Args:
             drone: Tello drone instance
             info: Face detection info [center_coordinates, area]
-            width: Frame width
+            width: Frame width (the height follows from the camera's aspect ratio)
             
         Returns:
             Tuple[int, dict]: Current tracking error and movement stats
         """
-        current_time = time.time()
+        current_time = self.clock()
         if current_time - self.last_movement_time < self.movement_timeout:
             return self.previous_error, {}
 
         fb = 0
         x, _ = info[0]
         area = info[1]
+        camera_width, camera_height = self.camera.image_size
+        camera = self.camera.for_size(width, round(width * camera_height / camera_width))
 
-        # Calculate PID control
-        error = x - width // 2
+        # Calculate PID control, on errors rescaled to the 1280 wide frames the gains were tuned on
+        error = camera.reference_pixels(x)
         speed = (self.config.pid[0] * error + 
                 self.config.pid[1] * (error - self.previous_error))
         speed = int(np.clip(speed, -self.config.max_speed, 
                            self.config.max_speed))
 
-        # Calculate forward/backward movement
-        if self.config.fb_range[0] < area < self.config.fb_range[1]:
+        # Calculate forward/backward movement, cascade boxes are square so width is sqrt(area)
+        distance = camera.face_distance(np.sqrt(area)) if area else 0
+        if self.config.distance_range[0] < distance < self.config.distance_range[1]:
             fb = 0
-        elif area > self.config.fb_range[1]:
+        elif 0 < distance < self.config.distance_range[0]:
             fb = -20
-        elif area < self.config.fb_range[0] and area != 0:
+        elif distance > self.config.distance_range[1]:
             fb = 20
 
         movement_stats = {
             'error': error,
             'speed': speed,
             'fb': fb,
-            'area': area
+            'area': area,
+            'distance': distance
         }
 
         if area != 0:
@@ -103,46 +119,54 @@ class FaceDetector:
             logging.error(f"Face detector initialization failed: {e}")
             raise
 
-    def find_face(self, img) -> Tuple[np.ndarray, List]:
+    def detect_faces(self, img, img_gray=None) -> np.ndarray:
+        """
+        Detect all faces in the image.
+
+        Args:
+            img: Input image in BGR format
+            img_gray: Grayscale version of img if already computed
+
+        Returns:
+            np.ndarray: Face boxes as rows of (x, y, w, h), empty if none were found
+        """
+        if img_gray is None:
+            img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = self.face_cascade.detectMultiScale(
+            img_gray, 
+            self.config.scale_factor, 
+            self.config.min_neighbors,
+            minSize=self.config.min_face_size,
+            maxSize=self.config.max_face_size if any(self.config.max_face_size) else None
+        )
+        return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+    def find_face(self, img, img_gray=None) -> Tuple[np.ndarray, List]:
         """
         Detect faces in the image and return the largest face's position and area.
+        The image is not drawn on, face boxes are shown by the HUD overlay instead.
         
         Args:
             img: Input image in BGR format
+            img_gray: Grayscale version of img if already computed
             
         Returns:
-            tuple: (processed_image, [center_coordinates, area])
+            tuple: (image, [center_coordinates, area])
         """
         try:
-            img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(
-                img_gray, 
-                self.config.scale_factor, 
-                self.config.min_neighbors,
-                minSize=self.config.min_face_size,
-                maxSize=self.config.max_face_size if any(self.config.max_face_size) else None
-            )
-
-            faces_centres = []
-            faces_areas = []
-
-            for (x, y, w, h) in faces:
-                cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)
-                cx = x + w // 2
-                cy = y + h // 2
-                area = w * h
-                cv2.circle(img, (cx, cy), 5, (0, 0, 255), cv2.FILLED)
-                faces_centres.append([cx, cy])
-                faces_areas.append(area)
-
-            if faces_areas:
-                i = faces_areas.index(max(faces_areas))
-                return img, [faces_centres[i], faces_areas[i]]
-            return img, [[0, 0], 0]
+            return img, self.largest_face(self.detect_faces(img, img_gray))
         except Exception as e:
             logging.error(f"Face detection failed: {e}")
             return img, [[0, 0], 0]
 
+    @staticmethod
+    def largest_face(faces: np.ndarray) -> List:
+        """[center_coordinates, area] of the largest face box, [[0, 0], 0] if there are none"""
+        if not len(faces):
+            return [[0, 0], 0]
+        x, y, w, h = (int(v) for v in faces[np.argmax(faces[:, 2] * faces[:, 3])])
+        return [[x + w // 2, y + h // 2], w * h]
+
 
 class VideoManager:
     """Manages video stream processing and snapshot functionality"""
@@ -154,6 +178,17 @@ class VideoManager:
         self.frame_count = 0
         self.last_frame_time = time.time()
         self.fps = 0
+        self.frame_bus = None
+        self.bus_detections = None  # Queue of (bus seq, boxes, frame shape) from the bus's detection process
+        self.bus_result = None
+        self.frame_processors = []
+        # Undistorts each decoded frame once, lookups by the raw frame find the result
+        self.frame_cache = tello_frame_cache.FrameCache(transform=self.prepare_frame)
+        self.last_processed_seq = -1
+        # Reuses the last detection while the picture stays still, None to detect every frame
+        self.motion_gate: Optional[tello_motion_gate.MotionGate] = tello_motion_gate.MotionGate()
+        self.display_enabled = True  # False when running headless without a pygame window
+        self.hud = None
         
         self.config.snapshot_dir.mkdir(parents=True, exist_ok=True)
         logging.basicConfig(level=logging.INFO)
@@ -168,6 +203,45 @@ class VideoManager:
             self.last_frame_time = current_time
         return self.fps
 
+    def attach_frame_bus(self, frame_bus, detection_process: bool = True):
+        """
+        Publish every frame to a shared-memory frame bus for consumer processes.
+        With detection_process, face detection moves to a consumer process on another core
+        and detect_faces() returns its latest result instead of running the cascade here,
+        as long as that result's frame is still on the bus.
+        """
+        self.frame_bus = frame_bus
+        if detection_process:
+            self.bus_detections = multiprocessing.Queue(maxsize=1)
+            frame_bus.start_consumer(detection_consumer, self.bus_detections, self.config)
+
+    def detach_frame_bus(self):
+        """Stop publishing and stop the consumer processes, the caller still closes the bus"""
+        if self.frame_bus is not None:
+            self.frame_bus.stop_consumers()
+        self.frame_bus = None
+        self.bus_detections = None
+        self.bus_result = None
+
+    def attach_hud(self, hud):
+        """Composite a tello_hud.Hud over every displayed frame and feed it the face boxes"""
+        self.hud = hud
+
+    def register_frame_processor(self, processor):
+        """
+        Call processor(derived_frame) with every raw frame before it is resized for display.
+        The DerivedFrame shares grayscale/pyramid images between processors.
+        """
+        self.frame_processors.append(processor)
+
+    def prepare_frame(self, raw: np.ndarray) -> np.ndarray:
+        """The frame every consumer sees, raw from the decoder or undistorted"""
+        return tello_camera.camera_model.undistort(raw) if self.config.undistort else raw
+
+    def processed_frame(self, raw: np.ndarray) -> np.ndarray:
+        """prepare_frame() of a frame from get_frame_read(), from the cache when update_stream has seen it"""
+        return self.frame_cache.lookup(raw).frame
+
     def take_a_snapshot(self):
         """Trigger snapshot on next frame"""
         self.take_snapshot = True
@@ -201,7 +275,29 @@ class VideoManager:
         status = {'fps': self.calculate_fps(), 'tracking_stats': None}
         
         try:
-            frame = drone.get_frame_read().frame
+            derived = self.frame_cache.put(drone.get_frame_read().frame)
+            frame = derived.frame
+            status['frame_seq'] = derived.seq
+            # The loop can come round again before the next frame is decoded, process each one once
+            if derived.seq != self.last_processed_seq:
+                self.last_processed_seq = derived.seq
+                if self.frame_bus is not None:
+                    try:
+                        status['bus_seq'] = self.frame_bus.publish(frame)
+                    except ValueError as e:
+                        logging.error(f"Frame bus disabled, detection is back in this process: {e}")
+                        self.detach_frame_bus()
+
+                processing_start = time.perf_counter()
+                for processor in self.frame_processors:
+                    processor(derived)
+                tello_blackbox.record('frame', '%d processed in %.2fms', derived.seq,
+                                      1000 * (time.perf_counter() - processing_start))
+
+            if not self.display_enabled:
+                if self.take_snapshot:
+                    status['snapshot_saved'] = self.save_snapshot(frame)
+                return status
             
             # Get pygame window dimensions
             pygame_dims = tello_pygame.get_dimensions()
@@ -221,6 +317,9 @@ class VideoManager:
             # Ensure frame matches pygame surface dimensions exactly
             if frame.shape[:2] == pygame_dims:  # Check dimensions before blitting
                 tello_pygame.blit_frame(frame)
+                if self.hud is not None:
+                    self.hud.set('fps', status['fps'])
+                    tello_pygame.blit_overlay(self.hud.render())
             else:
                 logging.warning(f"Frame dimensions {frame.shape[:2]} don't match pygame surface {pygame_dims}")
 
@@ -230,9 +329,91 @@ class VideoManager:
             return status
         
     def detect_face(self, frame) -> Tuple[np.ndarray, List]:
-        frame, info = self.face_detector.find_face(frame)
-        return frame, info
+        return frame, self.face_detector.largest_face(self.detect_faces(frame))
+
+    def latest_bus_detection(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Newest result from the detection process with the frame it was found in.
+
+        Returns:
+            tuple: (frame, boxes), or None before the first result and once the result's
+            frame has left the bus ring, which happens when the process dies or falls behind
+        """
+        try:
+            while True:
+                self.bus_result = self.bus_detections.get_nowait()
+        except queue.Empty:
+            pass
+        if self.bus_result is None:
+            return None
+        seq, boxes, shape = self.bus_result
+        frame = self.frame_bus.frame(seq)
+        if frame is None:
+            return None
+        if self.hud is not None:
+            self.hud.set_faces(boxes, shape)
+        return frame, boxes
 
+    def faces_in(self, frame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Face boxes for frame, with the frame they belong to for cropping them.
+
+        Returns:
+            tuple: (frame, boxes), the frame is a slightly older bus frame when the detection
+            process found the boxes, otherwise the (undistorted) frame the cache holds for frame
+        """
+        if self.bus_detections is not None:
+            found = self.latest_bus_detection()
+            if found is not None:
+                return found
+        return self._detect_here(frame)
+
+    def detect_faces(self, frame) -> np.ndarray:
+        return self.faces_in(frame)[1]
+
+    def _detect_here(self, frame) -> Tuple[np.ndarray, np.ndarray]:
+        # Detection can run in an executor, the lease keeps the next put() off these buffers.
+        # frame may be the raw one, detection runs on the (undistorted) frame the cache holds for it
+        with self.frame_cache.borrow(frame) as derived:
+            boxes = self.motion_gate.cached(derived) if self.motion_gate is not None else None
+            if boxes is not None:
+                return derived.frame, boxes
+
+            boxes = self.face_detector.detect_faces(derived.frame, derived.gray())
+            if self.motion_gate is not None:
+                self.motion_gate.store(derived, boxes)
+        if self.hud is not None:
+            self.hud.set_faces(boxes, derived.frame.shape)
+        return derived.frame, boxes
+
+
+def detection_consumer(bus_name: str, results, video_config: VideoConfig = VideoConfig()):
+    """
+    Frame bus consumer process running the face cascade on the newest published frame.
+    results is a maxsize 1 queue that always holds the latest (seq, boxes, frame shape).
+    """
+    # imported here, only the consumer process reads from the bus
+    import tello_framebus
+    reader = tello_framebus.FrameBusReader(bus_name)
+    detector = FaceDetector(video_config=video_config)
+    try:
+        while True:
+            seq, frame = reader.wait_for_frame(timeout=1.0)
+            if frame is None:
+                continue
+            boxes = detector.detect_faces(frame)
+            if not reader.is_current(seq):
+                continue  # Overwritten while detecting, the boxes may not match either frame
+            try:
+                results.get_nowait()  # Drop a result the control loop never picked up
+            except queue.Empty:
+                pass
+            try:
+                results.put_nowait((seq, boxes, frame.shape))
+            except queue.Full:
+                pass
+    finally:
+        reader.close()
 
 
 # Create global instance
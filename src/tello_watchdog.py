@@ -0,0 +1,325 @@
+import asyncio
+import contextlib
+import threading
+import time
+import argparse
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import tello_blackbox
+
+# Failsafe tiers, each one taken if the fault outlasts the previous
+TIER_NONE = 0
+TIER_ZERO_RC = 1
+TIER_HOVER = 2
+TIER_LAND = 3
+TIER_NAMES = ('none', 'zero rc', 'hover', 'land')
+
+
+@dataclass
+class WatchdogConfig:
+    """Deadlines for the health watchdog, all in seconds"""
+    check_rate: float = 100.0  # Hz, bounds the reaction time after a deadline passes
+    frame_timeout: float = 0.5  # Without a new video frame
+    state_timeout: float = 0.5  # Without a state packet, the drone sends them at about 10Hz
+    heartbeat_timeout: float = 0.3  # Without a successful control loop tick
+    hover_after: float = 1.0  # Fault time before asking the drone to hover
+    land_after: float = 4.0  # Fault time before landing
+    recover_after: float = 0.5  # Healthy time before control is handed back
+    fault_memory: float = 5.0  # Healthy time after a recovery before a new fault escalates from the start again
+    rc_interval: float = 0.1  # Seconds between zero rc commands while engaged
+
+
+@dataclass
+class WatchdogReaction:
+    """One failsafe engagement, for measuring how quickly the watchdog reacts"""
+    source: str  # frame, state or heartbeat
+    age: float  # How long the source had been silent when the zero rc went out
+    latency: float  # Time from the deadline passing to the zero rc going out
+    tier: int = TIER_ZERO_RC  # Highest tier reached
+
+
+class Watchdog:
+    """
+    Independent thread checking that video frames, state packets and control loop ticks
+    keep arriving. When one stops for longer than its deadline while flying, it takes the
+    link over from the control loop: zero rc straight away, then 'stop' (hover) and
+    finally land if the fault doesn't clear. Sources are only watched after they have
+    been seen once, so a stream that hasn't started yet doesn't count as stalled.
+
+    SDK calls that hold the control loop up on purpose (takeoff, flips, land) go through
+    blocking(), which suspends the control loop deadline. Nothing is sent while a land is
+    in flight, so a landing is never cut short by 'stop' or a second land.
+    """
+    def __init__(self, drone, controller=None, config: WatchdogConfig = WatchdogConfig()):
+        self.drone = drone
+        self.controller = controller
+        self.config = config
+        self.last_seen: Dict[str, Optional[float]] = {'frame': None, 'state': None, 'heartbeat': None}
+        self.timeouts = {'frame': config.frame_timeout, 'state': config.state_timeout,
+                         'heartbeat': config.heartbeat_timeout}
+        self.last_frame = None
+        self.last_state = None
+        self.tier = TIER_NONE
+        self.fault_start = 0.0
+        self.healthy_since: Optional[float] = None
+        self.recovered_at: Optional[float] = None
+        self.blocking_command: Optional[str] = None
+        self.last_rc_time = 0.0
+        self.reactions: List[WatchdogReaction] = []
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def engaged(self) -> bool:
+        """True while the watchdog owns the link and the control loop must not send rc"""
+        return self.tier != TIER_NONE
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='tello-watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    # Sources
+
+    def heartbeat(self):
+        """Call at the end of every full, successful control loop tick"""
+        self.last_seen['heartbeat'] = time.monotonic()
+
+    @contextlib.contextmanager
+    def blocking(self, command: str):
+        """
+        Wrap an SDK call that holds the control loop up, such as takeoff, a flip or land.
+
+        Args:
+            command: SDK command in flight, while it is 'land' the watchdog sends nothing
+        """
+        self.blocking_command = command
+        try:
+            yield
+        finally:
+            self.blocking_command = None
+            self.heartbeat()
+
+    def frame_received(self, derived):
+        """Frame processor: note when the decoder output changes, a stalled reader repeats the last one"""
+        # The raw decoder array, undistortion makes a new frame array even from a repeated one
+        if derived.source is not self.last_frame:
+            self.last_frame = derived.source
+            self.last_seen['frame'] = time.monotonic()
+
+    def _poll_state(self):
+        # AsyncTello timestamps its state packets, djitellopy swaps in a new dict per packet
+        last_state_time = getattr(self.drone, 'last_state_time', None)
+        if last_state_time is not None:
+            if last_state_time:
+                self.last_seen['state'] = last_state_time
+            return
+        state = self.drone.get_current_state()
+        if state is not self.last_state:
+            self.last_state = state
+            self.last_seen['state'] = time.monotonic()
+
+    def _is_flying(self) -> bool:
+        if self.controller is not None:
+            return self.controller.is_currently_flying
+        flying = getattr(self.drone, 'is_flying', True)
+        return flying() if callable(flying) else bool(flying)
+
+    def _stalest(self, now: float):
+        """(source, age) of the source furthest past its deadline, None if all are fresh"""
+        worst = None
+        for source, seen in self.last_seen.items():
+            if seen is None or (source == 'heartbeat' and self.blocking_command is not None):
+                continue
+            overdue = now - seen - self.timeouts[source]
+            if overdue > 0 and (worst is None or overdue > worst[2]):
+                worst = (source, now - seen, overdue)
+        return worst
+
+    # Failsafe
+
+    def _send_zero_rc(self, now: float):
+        self.drone.send_rc_control(0, 0, 0, 0)
+        self.last_rc_time = now
+
+    def _send_hover(self):
+        # 'stop' makes the drone hover in place, sent without waiting for the reply
+        if hasattr(self.drone, 'send_command_without_return'):
+            self.drone.send_command_without_return('stop')
+        else:
+            self.drone.submit_command('stop')
+
+    def _land(self):
+        try:
+            self.drone.land()
+        except Exception as e:
+            self.logger.error(f"Watchdog landing failed: {e}")
+            return
+        if self.controller is not None:
+            self.controller.stop_mission('watchdog landing')
+            self.controller.is_currently_flying = False
+
+    def _escalate(self, tier: int):
+        self.tier = tier
+        self.reactions[-1].tier = tier
+        self.logger.warning(f"Watchdog: {TIER_NAMES[tier]}")
+        tello_blackbox.record('watchdog', '%s', TIER_NAMES[tier])
+
+    def _on_fault(self, source: str, age: float, overdue: float, now: float):
+        self.healthy_since = None
+        if self.tier == TIER_NONE:
+            if not self._is_flying():
+                return
+            self._send_zero_rc(now)
+            # A fault soon after the last one carries on escalating, so a flapping source still ends in a landing
+            if self.recovered_at is None or now - self.recovered_at >= self.config.fault_memory:
+                self.fault_start = now
+            self.reactions.append(WatchdogReaction(source, age, overdue))
+            self.tier = TIER_ZERO_RC
+            self.logger.warning(f"Watchdog: no {source} for {age * 1000:.0f}ms, zero rc "
+                                f"({overdue * 1000:.1f}ms after the deadline)")
+            tello_blackbox.record('watchdog', 'no %s for %.0fms, zero rc', source, age * 1000)
+            tello_blackbox.dump('watchdog', background=True)
+            return
+
+        if self.tier == TIER_LAND:
+            return
+        if now - self.last_rc_time >= self.config.rc_interval:
+            self._send_zero_rc(now)
+        if self.tier < TIER_HOVER and now - self.fault_start >= self.config.hover_after:
+            self._escalate(TIER_HOVER)
+            self._send_hover()
+        if now - self.fault_start >= self.config.land_after:
+            self._escalate(TIER_LAND)
+            self._land()
+
+    def _on_healthy(self, now: float):
+        if self.tier == TIER_NONE:
+            return
+        if self.healthy_since is None:
+            self.healthy_since = now
+        elif now - self.healthy_since >= self.config.recover_after:
+            self.logger.info("Watchdog: all sources healthy, control handed back")
+            tello_blackbox.record('watchdog', 'recovered')
+            self.tier = TIER_NONE
+            self.healthy_since = None
+            self.recovered_at = now
+
+    def check(self, now: Optional[float] = None):
+        """One watchdog pass, run by the thread at check_rate"""
+        now = time.monotonic() if now is None else now
+        if self.blocking_command == 'land':
+            return
+        self._poll_state()
+        fault = self._stalest(now)
+        if fault is not None:
+            self._on_fault(*fault, now)
+        else:
+            self._on_healthy(now)
+
+    def _run(self):
+        period = 1.0 / self.config.check_rate
+        next_check = time.monotonic()
+        while self.running:
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Watchdog check failed: {e}")
+            next_check += period
+            delay = next_check - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_check = time.monotonic()
+
+
+async def demo(config: WatchdogConfig = WatchdogConfig(), failure: str = 'state',
+               command_port: int = 19889, state_port: int = 19890):
+    """
+    Fly forward against the simulator, stop one source and time the failsafe tiers.
+
+    Args:
+        failure: 'state' cuts the simulator's state packets, 'frame' stops the video frames
+            and 'heartbeat' stops the control loop ticks
+
+    Returns:
+        dict: Seconds from the source's last sign of life to each tier, plus the watchdog's own reaction
+    """
+    # imported here, only the demo needs the simulator and the asyncio link
+    import types
+    import tello_async
+    import tello_sim
+
+    simulator = tello_sim.SimulatedTello(tello_sim.SimulatorConfig(command_port=command_port,
+                                                                   state_port=state_port))
+    await simulator.start()
+    drone = tello_async.AsyncTello(tello_async.AsyncRuntimeConfig(
+        tello_ip='127.0.0.1', command_port=command_port, state_port=state_port))
+    watchdog = Watchdog(drone, config=config)
+    timeline = {}
+    try:
+        await drone.connect()
+        await drone.control_command('takeoff')
+        drone.is_flying = True
+        watchdog.start()
+
+        # Control loop flying forward while a stand-in video stream delivers new frames, only
+        # the chosen source fails
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        cut_time = None
+        while simulator.flying and loop.time() < start + 1.5 + config.land_after:
+            if cut_time is None or failure != 'heartbeat':
+                watchdog.heartbeat()
+                if not watchdog.engaged:
+                    drone.send_rc_control(0, 40, 0, 0)
+            if cut_time is None or failure != 'frame':
+                watchdog.frame_received(types.SimpleNamespace(source=object()))
+            if cut_time is None:
+                if loop.time() > start + 0.5:
+                    if failure == 'state':
+                        simulator.state_task.cancel()  # Link loss: no more state packets
+                    cut_time = time.monotonic()
+            else:
+                if 'zero rc' not in timeline and simulator.rc == (0, 0, 0, 0):
+                    timeline['zero rc'] = time.monotonic()
+                if 'hover' not in timeline and watchdog.tier >= TIER_HOVER:
+                    timeline['hover'] = time.monotonic()
+            await asyncio.sleep(0.005)
+        if cut_time is not None and not simulator.flying:
+            timeline['land'] = time.monotonic()
+        # From the last packet, frame or tick that got through, a packet already sent still arrives after the cut
+        last_seen = drone.last_state_time if failure == 'state' else watchdog.last_seen[failure]
+        timeline = {name: seen - last_seen for name, seen in timeline.items()}
+        if watchdog.reactions:
+            reaction = watchdog.reactions[0]
+            timeline['deadline'] = watchdog.timeouts[reaction.source]
+            timeline['latency after deadline'] = reaction.latency
+    finally:
+        # Off the loop thread, a landing in progress needs the loop for its reply
+        await asyncio.to_thread(watchdog.stop)
+        await drone.close()
+        simulator.stop()
+    return timeline
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the watchdog failsafe against the simulator")
+    parser.add_argument('--failure', choices=('state', 'frame', 'heartbeat'), default='state')
+    parser.add_argument('--state-timeout', type=float, default=WatchdogConfig.state_timeout)
+    parser.add_argument('--check-rate', type=float, default=WatchdogConfig.check_rate)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(demo(WatchdogConfig(state_timeout=args.state_timeout, check_rate=args.check_rate),
+                               args.failure))
+    for name, seconds in results.items():
+        print(f"{name:>24}: {seconds * 1000:7.1f} ms")
@@ -0,0 +1,22 @@
+import dataclasses
+import os
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The modules import each other as top-level names and load data/ paths relative to the repo root
+sys.path.insert(0, str(ROOT / 'src'))
+os.chdir(ROOT)
+
+import tello_blackbox
+
+
+@pytest.fixture(autouse=True)
+def black_box_dumps(tmp_path, monkeypatch):
+    """Black box dumps (watchdog, control exceptions) go to tmp_path instead of Logs/BlackBox"""
+    dump_dir = tmp_path / 'BlackBox'
+    monkeypatch.setattr(tello_blackbox.black_box, 'config',
+                        dataclasses.replace(tello_blackbox.black_box.config, dump_dir=dump_dir))
+    return dump_dir
@@ -0,0 +1,16 @@
+import numpy as np
+import tello_framebus
+
+
+def test_frame_is_gone_once_its_slot_is_reused():
+    config = tello_framebus.FrameBusConfig(name='tello_frames_test', slots=4, frame_height=8, frame_width=8)
+    bus = tello_framebus.FrameBus(config)
+    try:
+        for value in range(5):
+            bus.publish(np.full(bus.shape, value, dtype=np.uint8))
+        assert bus.frame(0) is None  # Overwritten by frame 4
+        assert bus.frame(1)[0, 0, 0] == 1
+        assert bus.frame(4)[0, 0, 0] == 4
+        assert bus.frame(5) is None
+    finally:
+        bus.close()
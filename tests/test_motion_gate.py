@@ -0,0 +1,25 @@
+import numpy as np
+import tello_frame_cache
+import tello_motion_gate
+
+
+def test_reuse_is_counted_per_frame_not_per_lookup():
+    cache = tello_frame_cache.FrameCache()
+    gate = tello_motion_gate.MotionGate(tello_motion_gate.MotionGateConfig(max_reuse_age=60.0))
+    still = np.full((720, 960, 3), 128, dtype=np.uint8)
+
+    derived = cache.put(still.copy())
+    assert gate.cached(derived) is None
+    gate.store(derived, 'faces')
+    for _ in range(20):  # An unpaced loop looking the detected frame up again
+        assert gate.cached(derived) == 'faces'
+    assert gate.stats()['detected'] == 1 and gate.stats()['reused'] == 0
+
+    # Unchanged new frames reuse the result for max_reuse_frames frames, however often each is looked up
+    for _ in range(gate.config.max_reuse_frames):
+        derived = cache.put(still.copy())
+        for _ in range(3):
+            assert gate.cached(derived) == 'faces'
+    assert gate.stats()['reused'] == gate.config.max_reuse_frames
+    assert gate.cached(cache.put(still.copy())) is None
+    assert gate.stats()['detected'] == 2
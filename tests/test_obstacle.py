@@ -0,0 +1,59 @@
+import numpy as np
+import cv2
+import pytest
+import tello_frame_cache
+import tello_obstacle
+
+FPS = 30.0
+TTC = 5.0  # Seconds to contact at the first frame, counting down as the drone approaches
+
+
+def approach_frames(count: int, seed: int = 0):
+    """960x720 frames of a textured wall approached at a constant time to contact"""
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (720, 960), dtype=np.uint8), (0, 0), 4)
+    texture = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+    frames = []
+    for i in range(count):
+        scale = 1.0 / (1.0 - i / (FPS * TTC))
+        matrix = cv2.getRotationMatrix2D((479.5, 359.5), 0, scale)
+        gray = cv2.warpAffine(texture, matrix, (960, 720), borderMode=cv2.BORDER_REFLECT)
+        frames.append(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def run(frames, calls_per_frame: int = 1, new_entry_per_call: bool = False):
+    """Feed frames at FPS, each one calls_per_frame times at later processing times"""
+    cache = tello_frame_cache.FrameCache()
+    detector = tello_obstacle.ObstacleDetector()
+    estimates = []
+    for i, frame in enumerate(frames):
+        arrival = 1000.0 + i / FPS
+        derived = None
+        for call in range(calls_per_frame):
+            if derived is None or new_entry_per_call:
+                derived = cache.put(frame)
+                derived.timestamp = arrival
+            detector.update(derived)
+        estimates.append(float(detector.ttc[detector.central].min()))
+    return detector, estimates
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return approach_frames(45)
+
+
+def test_time_to_contact_matches_approach(frames):
+    _, estimates = run(frames)
+    truth = TTC - np.arange(len(frames)) / FPS
+    # Past the smoothing warm-up the estimate follows the true time to contact
+    np.testing.assert_allclose(estimates[-15:], truth[-15:], rtol=0.25)
+
+
+@pytest.mark.parametrize('new_entry_per_call', [False, True])
+def test_duplicated_frames_give_the_same_estimate(frames, new_entry_per_call):
+    once, _ = run(frames)
+    repeated, _ = run(frames, calls_per_frame=3, new_entry_per_call=new_entry_per_call)
+    np.testing.assert_allclose(repeated.ttc, once.ttc)
+    assert repeated.last_update == once.last_update
@@ -0,0 +1,34 @@
+import asyncio
+import tello_command
+import tello_swarm
+
+
+class FakeDrone:
+    def __init__(self, address, reply):
+        self.address = address
+        self.reply = reply
+        self.is_flying = False
+        self.channel = self
+
+    async def command(self, command):
+        if self.reply is None:
+            raise tello_command.CommandTimeout(f"No reply to '{command}'")
+        return tello_command.CommandResult(0, command, self.reply, 0.01, 1)
+
+    def send_unacked(self, command):
+        pass
+
+
+def test_group_commands_survive_a_lost_reply():
+    swarm = tello_swarm.Swarm()
+    swarm.drones = [FakeDrone('a', 'ok'), FakeDrone('b', None), FakeDrone('c', 'error')]
+
+    asyncio.run(swarm.takeoff())
+    # The lost reply doesn't stop the others being marked airborne, and may have flown itself
+    assert [drone.is_flying for drone in swarm.drones] == [True, True, False]
+
+    results = asyncio.run(swarm.group_command('battery?'))
+    assert [result.ok for result in results] == [True, False, False]
+
+    asyncio.run(swarm.land())
+    assert [drone.is_flying for drone in swarm.drones] == [False, True, False]
@@ -0,0 +1,36 @@
+import tello_input
+import tello_keyboard
+import tello_tuning
+
+
+def test_profile_gains_reach_face_tracking(tmp_path):
+    path = tmp_path / 'profile.json'
+    tello_tuning.save_profile({'drone': {'tracking_yaw_gain': 0.3, 'tracking_max_speed': 50}}, path)
+    controller = tello_keyboard.DroneController(tello_tuning.load_profile(path), video_manager=None)
+    default = tello_keyboard.DroneController(tello_keyboard.DroneConfig(), video_manager=None)
+
+    width, height = controller.camera.image_size
+    face = [(width * 0.7, height / 2, 100, 100)]
+    _, _, _, yaw = controller.face_tracking_rc(face)
+    _, _, _, default_yaw = default.face_tracking_rc(face)
+    assert default_yaw == tello_keyboard.DroneConfig.tracking_max_speed
+    assert default_yaw < yaw <= 50
+
+
+def test_profile_gains_reach_the_drone_while_tracking(tmp_path):
+    path = tmp_path / 'profile.json'
+    tello_tuning.save_profile({'drone': {'tracking_yaw_gain': 0.3, 'tracking_max_speed': 50}}, path)
+    controller = tello_keyboard.DroneController(tello_tuning.load_profile(path), video_manager=None)
+    controller.input_backend = tello_input.ScriptedBackend([tello_input.ScriptStep(10.0)])
+    controller.patrol_tracking_active = True
+    controller.detection_task_active = True
+    width, height = controller.camera.image_size
+    controller.detected_face = [(width * 0.7, height / 2, 100, 100)]
+    drone = tello_tuning.SimDrone()
+    sent = []
+    drone.send_rc_control = lambda *rc: sent.append(rc)
+
+    assert controller.update_controls(drone)
+    # The tracking rc is the last one sent, not replaced by the pilot's zero sticks
+    assert sent[-1] == controller.face_tracking_rc(controller.detected_face)
+    assert sent[-1][3] > tello_keyboard.DroneConfig.tracking_max_speed
@@ -0,0 +1,75 @@
+import asyncio
+import types
+import pytest
+import tello_watchdog
+
+CONFIG = tello_watchdog.WatchdogConfig(hover_after=0.5, land_after=1.0)
+MAX_LATENCY = 0.05  # Seconds after the deadline, the check runs every 10ms
+
+
+@pytest.mark.parametrize('failure, port', [('state', 19891), ('frame', 19893), ('heartbeat', 19895)])
+def test_failsafe_reaction_and_escalation(failure, port):
+    timeline = asyncio.run(tello_watchdog.demo(CONFIG, failure, command_port=port, state_port=port + 1))
+
+    deadline = timeline['deadline']
+    assert deadline == getattr(CONFIG, f'{failure}_timeout')
+    assert 0 <= timeline['latency after deadline'] < MAX_LATENCY
+    assert deadline <= timeline['zero rc'] < deadline + MAX_LATENCY + 0.02
+
+    # Zero rc, then hover and land, each timed from the first reaction
+    assert timeline['zero rc'] < timeline['hover'] < timeline['land']
+    assert timeline['hover'] - timeline['zero rc'] == pytest.approx(CONFIG.hover_after, abs=MAX_LATENCY)
+    assert timeline['land'] - timeline['zero rc'] == pytest.approx(CONFIG.land_after, abs=0.1)
+
+
+class FakeDrone:
+    def __init__(self):
+        self.sent = []
+        self.is_flying = True
+        self.last_state_time = 0.0
+
+    def send_rc_control(self, *rc):
+        self.sent.append('rc')
+
+    def send_command_without_return(self, command):
+        self.sent.append(command)
+
+    def land(self):
+        self.sent.append('land')
+
+
+def test_flapping_fault_keeps_escalating():
+    drone = FakeDrone()
+    watchdog = tello_watchdog.Watchdog(drone, config=CONFIG)
+    watchdog.last_seen['heartbeat'] = 0.0
+    watchdog.check(now=0.4)  # Fault from 0.3s
+    for now in (0.45, 0.96):  # Healthy for the recovery time, control handed back
+        watchdog.last_seen['heartbeat'] = now
+        watchdog.check(now=now)
+    assert not watchdog.engaged
+    for now in (1.3, 1.31):  # Faulty again, still counted from the first fault
+        watchdog.check(now=now)
+    assert watchdog.tier == tello_watchdog.TIER_HOVER
+    assert watchdog.fault_start == pytest.approx(0.4)
+
+
+def test_nothing_sent_while_landing():
+    drone = FakeDrone()
+    watchdog = tello_watchdog.Watchdog(drone, config=CONFIG)
+    watchdog.last_seen['heartbeat'] = 0.0
+    with watchdog.blocking('land'):
+        watchdog.last_seen['heartbeat'] = 0.0  # The land takes longer than any deadline
+        for now in (0.5, 1.0, 2.0, 3.0):
+            watchdog.check(now=now)
+    assert drone.sent == []
+    assert not watchdog.engaged
+
+
+def test_repeated_raw_frame_is_stale():
+    watchdog = tello_watchdog.Watchdog(FakeDrone(), config=CONFIG)
+    raw = object()
+    watchdog.frame_received(types.SimpleNamespace(source=raw, frame=object()))
+    first = watchdog.last_seen['frame']
+    # Undistortion gives a new frame array each time, the decoder output is what counts
+    watchdog.frame_received(types.SimpleNamespace(source=raw, frame=object()))
+    assert watchdog.last_seen['frame'] == first